@@ -0,0 +1,115 @@
+"""
+Measure how long a fresh process takes to serve its first requests.
+
+    python benchmarks/cold_start.py --output before.json
+    python benchmarks/cold_start.py --compare before.json
+
+Each trial is a new interpreter that imports the app (import time), answers
+GET / (boot to first response), GET /planets (first database round trip)
+and GET /admin/ (first admin page). The median over --trials is reported,
+along with the slowest imports of app.py from `python -X importtime`. With
+--compare, any figure that grew past --threshold is flagged and the exit
+status is 1.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {src!r})
+from app import app
+imported = time.perf_counter()
+client = app.test_client()
+timings = {{'import_ms': (imported - started) * 1000}}
+for name, url in (('first_response_ms', '/'), ('first_query_ms', '/planets'), ('first_admin_ms', '/admin/')):
+    request_started = time.perf_counter()
+    status = client.get(url).status_code
+    assert status == 200, (url, status)
+    timings[name] = (time.perf_counter() - request_started) * 1000
+timings['boot_to_first_response_ms'] = timings['import_ms'] + timings['first_response_ms']
+print(json.dumps(timings))
+'''
+
+CREATE_TABLES = '''
+import sys
+sys.path.insert(0, {src!r})
+from app import app
+from models import db
+with app.app_context():
+    db.create_all()
+'''
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trials', type=int, default=5)
+    parser.add_argument('--top-imports', type=int, default=10)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='previous results JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.20, help='allowed relative slowdown (default 0.20)')
+    return parser.parse_args()
+
+def run_python(code, env, *flags):
+    return subprocess.run([sys.executable, *flags, '-c', code], env=env, capture_output=True, text=True, check=True)
+
+def slowest_imports(env, count):
+    # -X importtime lines are "import time: self | cumulative | <indent>module", two more
+    # spaces of indent per level; the modules app.py imports sit one level below `app`
+    stderr = run_python(f'import sys; sys.path.insert(0, {SRC!r}); import app', env, '-X', 'importtime').stderr
+    top_level = []
+    for line in stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            name = parts[2].rstrip()
+            if len(name) - len(name.lstrip()) == 5:
+                top_level.append((name.strip(), int(parts[1]) / 1000))
+    top_level.sort(key=lambda item: item[1], reverse=True)
+    return [{'module': module, 'cumulative_ms': round(ms, 1)} for module, ms in top_level[:count]]
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='swapi-cold-start-')
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.join(workdir, "cold.db")}')
+    run_python(CREATE_TABLES.format(src=SRC), env)
+
+    trials = [json.loads(run_python(PROBE.format(src=SRC), env).stdout) for _ in range(args.trials)]
+    results = {
+        'meta': {'trials': args.trials, 'python': sys.version.split()[0],
+                 'admin_lazy': os.environ.get('ADMIN_LAZY', 'true')},
+        'timings': {name: round(statistics.median(trial[name] for trial in trials), 1) for name in trials[0]},
+        'slowest_imports': slowest_imports(env, args.top_imports),
+    }
+
+    for name, value in results['timings'].items():
+        print(f'{name:<28} {value:>8} ms')
+    print('\nslowest imports of app.py:')
+    for item in results['slowest_imports']:
+        print(f'  {item["module"]:<26} {item["cumulative_ms"]:>8} ms')
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['timings']
+        regressions = [
+            f'{name}: {baseline[name]}ms -> {value}ms'
+            for name, value in results['timings'].items()
+            if name in baseline and value > baseline[name] * (1 + args.threshold)
+        ]
+        if regressions:
+            print('\nREGRESSIONS:\n  ' + '\n  '.join(regressions))
+            sys.exit(1)
+        print('\nno regressions')
+
+if __name__ == '__main__':
+    main()
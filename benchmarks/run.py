@@ -0,0 +1,315 @@
+"""
+Benchmark every route of the API against a throwaway database.
+
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --output after.json --compare before.json
+
+The database (a temporary SQLite file unless --database-url points at a
+local Postgres) is seeded with the requested volumes. Each endpoint is then
+driven through the Flask test client, and its throughput, p50/p95/p99 latency
+and SQL statements per request are reported. With --compare, any endpoint
+whose p95 latency or query count regressed past --threshold is flagged, and
+the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file; must point at a throwaway database')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--planets', type=int, default=5000)
+    parser.add_argument('--vehicles', type=int, default=5000)
+    parser.add_argument('--characters', type=int, default=5000)
+    parser.add_argument('--favorites', type=int, default=20, help='favorites of each kind per user')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed requests per endpoint')
+    parser.add_argument('--only', help='comma-separated endpoint names to run')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='previous results JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.20, help='allowed relative p95 slowdown (default 0.20)')
+    return parser.parse_args()
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Layout:
+    # Fixed id ranges, so every request can be generated without looking anything up
+
+    def __init__(self, args):
+        n = args.requests + args.warmup
+        self.n = n
+        self.users = args.users
+        self.planets = args.planets
+        self.vehicles = args.vehicles
+        self.characters = args.characters
+        self.favorites = min(args.favorites, args.planets, args.vehicles, args.characters)
+        # Spare rows that the DELETE cases consume, one per request
+        self.spare_users = range(self.users + 1, self.users + n + 1)
+        self.spare_planets = range(self.planets + 1, self.planets + n + 1)
+        self.spare_vehicles = range(self.vehicles + 1, self.vehicles + n + 1)
+        self.spare_characters = range(self.characters + 1, self.characters + n + 1)
+        # Users that start without favorites, for the add/delete favorite cases
+        self.favorite_user = self.users + n + 1
+        self.batch_user = self.users + n + 2
+
+def seed(db, models, layout):
+    from sqlalchemy import insert
+    User, Planets, Vehicles, Characters, FavoritePlanets, FavoriteVehicles, FavoriteCharacters = models
+    total_users = layout.batch_user
+    total_planets = layout.planets + layout.n
+    total_vehicles = layout.vehicles + layout.n
+    total_characters = layout.characters + layout.n
+
+    db.session.execute(insert(User), [
+        {'id': i, 'user_name': f'user{i}', 'email': f'user{i}@bench.local', 'password': 'secret', 'is_active': True}
+        for i in range(1, total_users + 1)
+    ])
+    db.session.execute(insert(Planets), [
+        {'planet_id': i, 'name': f'Planet {i}', 'diameter': 1000 + i, 'population': i * 1000,
+         'duration_day': 24, 'terrain': ('desert', 'ice', 'jungle', 'ocean')[i % 4]}
+        for i in range(1, total_planets + 1)
+    ])
+    db.session.execute(insert(Vehicles), [
+        {'vehicle_id': i, 'name': f'Vehicle {i}', 'crew': i % 50, 'model': f'Model {i % 20}',
+         'lenght': i % 300, 'cargo_capacity': i * 10}
+        for i in range(1, total_vehicles + 1)
+    ])
+    db.session.execute(insert(Characters), [
+        {'character_id': i, 'name': f'Character {i}', 'skin_color': ('fair', 'gold', 'green')[i % 3],
+         'birth_year': f'{i % 900}BBY', 'gender': ('male', 'female', 'n/a')[i % 3], 'height': 100 + i % 120}
+        for i in range(1, total_characters + 1)
+    ])
+    for model, column, count in ((FavoritePlanets, 'planet_id', layout.planets),
+                                 (FavoriteVehicles, 'vehicle_id', layout.vehicles),
+                                 (FavoriteCharacters, 'character_id', layout.characters)):
+        rows = [
+            {'user_id': user_id, column: (user_id * layout.favorites + k) % count + 1}
+            for user_id in range(1, layout.users + 1)
+            for k in range(layout.favorites)
+        ]
+        for start in range(0, len(rows), 10000):
+            db.session.execute(insert(model), rows[start:start + 10000])
+    # Favorites were inserted directly, so fill in the denormalized counters
+    from favorites import FAVORITE_KINDS, recount_favorites
+    for kind in FAVORITE_KINDS:
+        recount_favorites(kind)
+    db.session.commit()
+
+def build_cases(layout):
+    # endpoint name -> function(i) returning (method, url, request kwargs).
+    # 'endpoint:variant' names add more cases for the same route.
+    # Order matters: reads run first, and each DELETE runs after the POST it undoes
+    L = layout
+    planet_body = lambda name: {'name': name, 'diameter': 1, 'population': 1, 'duration_day': 24, 'terrain': 'desert'}
+    vehicle_body = lambda name: {'name': name, 'crew': 1, 'model': 'X', 'lenght': 1, 'cargo_capacity': 1}
+    character_body = lambda name: {'name': name, 'skin_color': 'fair', 'birth_year': '1BBY', 'gender': 'n/a', 'height': 1}
+
+    profile_token = {'X-Profile-Token': os.environ.get('PROFILE_TOKEN', '')}
+
+    def ndjson(rows):
+        return {'data': '\n'.join(json.dumps(row) for row in rows), 'content_type': 'application/x-ndjson'}
+
+    def batch(i):
+        # Alternate adding and removing the same planet, so the favorites never run out
+        planet_id = i // 2 % L.planets + 1
+        action = 'add' if i % 2 == 0 else 'remove'
+        return 'PATCH', f'/user/{L.batch_user}/favorites', {'json': {action: {'planets': [planet_id]}}}
+
+    return {
+        'sitemap': lambda i: ('GET', '/', {}),
+        'get_all_users': lambda i: ('GET', '/user', {}),
+        'get_single_user': lambda i: ('GET', f'/user/{i % L.users + 1}', {}),
+        'get_favorites': lambda i: ('GET', f'/user/{i % L.users + 1}/favorites', {}),
+        'get_all_planets': lambda i: ('GET', '/planets', {}),
+        'get_all_planets:filtered': lambda i: ('GET', '/planets?population__gt=1000000&terrain=desert&sort=-population', {}),
+        'get_all_planets:ids': lambda i: ('GET', '/planets?ids=' + ','.join(str((i + k) % L.planets + 1) for k in range(12)), {}),
+        'get_single_planet': lambda i: ('GET', f'/planet/{i % L.planets + 1}', {}),
+        'get_all_vehicles': lambda i: ('GET', '/vehicles', {}),
+        'get_single_vehicle': lambda i: ('GET', f'/vehicle/{i % L.vehicles + 1}', {}),
+        'get_all_characters': lambda i: ('GET', '/characters', {}),
+        'get_all_characters:filtered': lambda i: ('GET', '/characters?gender__in=female,n/a&sort=height', {}),
+        'get_single_character': lambda i: ('GET', f'/character/{i % L.characters + 1}', {}),
+        'get_popular': lambda i: ('GET', f'/popular/{("planets", "vehicles", "characters")[i % 3]}?limit=10', {}),
+        'search': lambda i: ('GET', f'/search?q={("Planet 1", "ehicle 4", "char", "9")[i % 4]}', {}),
+        'export_table': lambda i: ('GET', '/export/planets', {}),
+        # The detail screen: a dozen planets, vehicles and characters in one round trip
+        'batch': lambda i: ('POST', '/batch', {'json': {'requests': [
+            f'/{kind}s?ids=' + ','.join(str((i + k) % total + 1) for k in range(12))
+            for kind, total in (('planet', L.planets), ('vehicle', L.vehicles), ('character', L.characters))
+        ]}}),
+        'cache_stats': lambda i: ('GET', '/cache/stats', {}),
+        'get_pool_stats': lambda i: ('GET', '/pool/stats', {}),
+        # Only registered when read replicas are configured
+        'get_replica_stats': lambda i: ('GET', '/replicas/stats', {}),
+        'get_metrics': lambda i: ('GET', '/metrics', {}),
+        # Only registered when FAVORITES_WRITE_BEHIND is set
+        'get_favorite_queue_stats': lambda i: ('GET', '/favorites/queue/stats', {}),
+        # Only registered when PROFILE_DIR is set
+        'list_profiles': lambda i: ('GET', '/profiles', {'headers': profile_token}),
+        'get_profile': lambda i: ('GET', '/profiles/get_all_planets', {'headers': profile_token}),
+
+        'create_user': lambda i: ('POST', '/user', {'json': {'user_name': f'new{i}', 'email': f'new{i}@bench.local', 'password': 'secret'}}),
+        'update_user': lambda i: ('PUT', '/user/1', {'json': {'user_name': 'user1', 'email': 'user1@bench.local', 'password': f'secret{i}'}}),
+        'deactivate_user': lambda i: ('DELETE', f'/user/{L.spare_users[i]}', {}),
+        'add_planet': lambda i: ('POST', '/planet', {'json': planet_body(f'New planet {i}')}),
+        'add_planets_bulk': lambda i: ('POST', '/planets/bulk', ndjson([planet_body(f'Bulk planet {i}-{k}') for k in range(50)])),
+        'update_planet': lambda i: ('PUT', '/planet/1', {'json': planet_body('Planet 1')}),
+        'delete_planet': lambda i: ('DELETE', f'/planet/{L.spare_planets[i]}', {}),
+        'add_vehicle': lambda i: ('POST', '/vehicle', {'json': vehicle_body(f'New vehicle {i}')}),
+        'add_vehicles_bulk': lambda i: ('POST', '/vehicles/bulk', ndjson([vehicle_body(f'Bulk vehicle {i}-{k}') for k in range(50)])),
+        'update_vehicle': lambda i: ('PUT', '/vehicle/1', {'json': vehicle_body('Vehicle 1')}),
+        'delete_vehicle': lambda i: ('DELETE', f'/vehicle/{L.spare_vehicles[i]}', {}),
+        'add_character': lambda i: ('POST', '/character', {'json': character_body(f'New character {i}')}),
+        'add_characters_bulk': lambda i: ('POST', '/characters/bulk', ndjson([character_body(f'Bulk character {i}-{k}') for k in range(50)])),
+        'update_character': lambda i: ('PUT', '/character/1', {'json': character_body('Character 1')}),
+        'delete_character': lambda i: ('DELETE', f'/character/{L.spare_characters[i]}', {}),
+        'add_favorite_planet': lambda i: ('POST', f'/favorite/planet/{i % L.planets + 1}/{L.favorite_user}', {}),
+        'delete_favorite_planet': lambda i: ('DELETE', f'/favorite/planet/{i % L.planets + 1}/{L.favorite_user}', {}),
+        'add_favorite_vehicle': lambda i: ('POST', f'/favorite/vehicle/{i % L.vehicles + 1}/{L.favorite_user}', {}),
+        'delete_favorite_vehicle': lambda i: ('DELETE', f'/favorite/vehicle/{i % L.vehicles + 1}/{L.favorite_user}', {}),
+        'add_favorite_character': lambda i: ('POST', f'/favorite/character/{i % L.characters + 1}/{L.favorite_user}', {}),
+        'delete_favorite_character': lambda i: ('DELETE', f'/favorite/character/{i % L.characters + 1}/{L.favorite_user}', {}),
+        'update_favorites': batch,
+    }
+
+def run_case(client, make_request, args, query_counter):
+    for i in range(args.warmup):
+        method, url, kwargs = make_request(i)
+        client.open(url, method=method, **kwargs).close()
+
+    latencies, queries, statuses = [], [], {}
+    started = time.perf_counter()
+    for i in range(args.warmup, args.warmup + args.requests):
+        method, url, kwargs = make_request(i)
+        query_counter[0] = 0
+        request_started = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        response.get_data()
+        latencies.append(time.perf_counter() - request_started)
+        queries.append(query_counter[0])
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        response.close()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    method, url, kwargs = make_request(args.warmup)
+    return {
+        'method': method,
+        'example_url': url,
+        'requests': args.requests,
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        'throughput_rps': round(args.requests / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+    }
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for endpoint, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(endpoint)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(f'{endpoint}: p95 {previous["p95_ms"]}ms -> {current["p95_ms"]}ms')
+        if current['queries_per_request'] > previous['queries_per_request']:
+            regressions.append(f'{endpoint}: queries/request {previous["queries_per_request"]} -> {current["queries_per_request"]}')
+    return regressions
+
+def main():
+    args = parse_args()
+    workdir = None
+    if args.database_url is None:
+        workdir = tempfile.mkdtemp(prefix='swapi-bench-')
+        args.database_url = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    os.environ['DATABASE_URL'] = args.database_url
+    # Only the primary is seeded, so every query must run there
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+    os.environ.pop('DATABASE_REPLICA_URLS', None)
+    sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+    from sqlalchemy import event
+    from app import app
+    from models import db, User, Planets, Vehicles, Characters, FavoritePlanets, FavoriteVehicles, FavoriteCharacters
+
+    layout = Layout(args)
+    cases = build_cases(layout)
+    routes = {rule.endpoint for rule in app.url_map.iter_rules()
+              if '.' not in rule.endpoint and rule.endpoint not in ('static', 'admin')}
+    missing = sorted(routes - {name.split(':')[0] for name in cases})
+    if missing:
+        print(f'warning: no benchmark case for: {", ".join(missing)}', file=sys.stderr)
+    # Routes that depend on an optional package may not be registered
+    cases = {name: case for name, case in cases.items() if name.split(':')[0] in routes}
+    if args.only:
+        selected = args.only.split(',')
+        cases = {name: case for name, case in cases.items() if name in selected}
+
+    query_counter = [0]
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_started = time.perf_counter()
+        seed(db, (User, Planets, Vehicles, Characters, FavoritePlanets, FavoriteVehicles, FavoriteCharacters), layout)
+        print(f'seeded in {time.perf_counter() - seed_started:.1f}s', file=sys.stderr)
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(*args):
+            query_counter[0] += 1
+
+    client = app.test_client()
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'database': args.database_url.split(':', 1)[0],
+            'volumes': {'users': args.users, 'planets': args.planets, 'vehicles': args.vehicles,
+                        'characters': args.characters, 'favorites_per_kind': layout.favorites},
+            'requests': args.requests,
+            'warmup': args.warmup,
+        },
+        'endpoints': {},
+    }
+
+    print(f'{"endpoint":<28} {"rps":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"queries":>8}  status')
+    for name, make_request in cases.items():
+        result = run_case(client, make_request, args, query_counter)
+        results['endpoints'][name] = result
+        print(f'{name:<28} {result["throughput_rps"]:>9} {result["p50_ms"]:>9} {result["p95_ms"]:>9} '
+              f'{result["p99_ms"]:>9} {result["queries_per_request"]:>8}  {result["status_codes"]}')
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        if regressions:
+            print('\nREGRESSIONS:\n  ' + '\n  '.join(regressions))
+            sys.exit(1)
+        print('\nno regressions')
+
+if __name__ == '__main__':
+    main()
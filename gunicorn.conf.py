@@ -0,0 +1,129 @@
+# Production gunicorn profile, used by the Procfile and render.yaml:
+#     gunicorn --config gunicorn.conf.py
+# Everything can be tuned from the environment; the defaults are sized from
+# the CPU count so a deploy needs no hand-tuning.
+
+import gc
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+def env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes')
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'gevent': 'gevent',
+    'uvicorn': 'uvicorn.workers.UvicornWorker',
+}
+
+cpu_count = multiprocessing.cpu_count()
+worker_kind = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_kind not in WORKER_CLASSES:
+    raise ValueError(f'Unknown GUNICORN_WORKER_CLASS {worker_kind!r}, expected one of: {", ".join(WORKER_CLASSES)}')
+# The gevent profile needs gevent for the workers and psycogreen to make
+# psycopg2 cooperative (see post_fork); both are in the Pipfile
+if worker_kind == 'gevent':
+    missing = [name for name in ('gevent', 'psycogreen') if importlib.util.find_spec(name) is None]
+    if missing:
+        raise ValueError(f'GUNICORN_WORKER_CLASS=gevent needs {" and ".join(missing)} installed (pipenv install)')
+
+chdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+wsgi_app = 'asgi:application' if worker_kind == 'uvicorn' else 'wsgi'
+bind = f'0.0.0.0:{os.environ.get("PORT", 3000)}'
+worker_class = WORKER_CLASSES[worker_kind]
+
+# Sync workers block on every round trip, so they need the classic 2 * CPU + 1.
+# Threaded and async workers overlap I/O inside each process, one per CPU is enough
+if worker_kind == 'sync':
+    default_workers = cpu_count * 2 + 1
+else:
+    default_workers = cpu_count + 1
+workers = env_int('WEB_CONCURRENCY', min(default_workers, env_int('GUNICORN_MAX_WORKERS', 8)))
+threads = env_int('GUNICORN_THREADS', 4) if worker_kind == 'gthread' else 1
+worker_connections = env_int('GUNICORN_WORKER_CONNECTIONS', 1000)
+
+# Load the app once in the master so workers share its memory copy-on-write and fork fast.
+# Not with gevent: its workers monkey-patch after the fork, so the locks and
+# threading objects a preloaded app creates at import time (caches, pools, the
+# write-behind queue) would stay unpatched and block the whole worker
+preload_app = env_bool('GUNICORN_PRELOAD', worker_kind != 'gevent')
+if preload_app and worker_kind == 'gevent':
+    raise ValueError('GUNICORN_PRELOAD can\'t be used with gevent workers')
+
+timeout = env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+# Recycle workers regularly to bound slow leaks; the jitter keeps them from restarting together
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-')
+
+# /metrics aggregates every worker through files in this directory. It must be
+# set before the app (and prometheus_client) is imported, and start out empty
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='swapi-metrics-')
+prometheus_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+
+def on_starting(server):
+    shutil.rmtree(prometheus_dir, ignore_errors=True)
+    os.makedirs(prometheus_dir, exist_ok=True)
+    # With FAVORITES_DURABILITY=commit each request waits for its own change,
+    # so a batch holds at most one change per concurrent request in the
+    # worker: one under sync workers (only the flush delay is added), up to
+    # GUNICORN_THREADS under gthread, many under gevent and uvicorn
+    if (env_bool('FAVORITES_WRITE_BEHIND', False) and worker_kind == 'sync'
+            and os.environ.get('FAVORITES_DURABILITY', 'commit') == 'commit'):
+        server.log.warning('FAVORITES_WRITE_BEHIND with sync workers and FAVORITES_DURABILITY=commit commits '
+                           'one change per batch and only adds FAVORITES_FLUSH_MS to every favorite write; '
+                           'use gthread, gevent or uvicorn workers, or FAVORITES_DURABILITY=queued')
+
+def when_ready(server):
+    # Move everything the preloaded app allocated out of the GC's reach, so the
+    # collector doesn't touch (and un-share) those pages in every worker
+    if preload_app:
+        gc.freeze()
+
+def post_fork(server, worker):
+    # Connections opened in the master (e.g. during preload) must never be
+    # shared between processes: give each worker fresh pools. close=False
+    # leaves the parent's sockets alone instead of closing them under it
+    if worker_kind == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+    if 'app' in sys.modules:
+        from app import app
+        from models import db
+        with app.app_context():
+            db.engine.dispose(close=False)
+        if 'replicas' in app.extensions:
+            app.extensions['replicas'].dispose(close=False)
+    if 'asgi' in sys.modules:
+        from asgi import async_engine, async_replicas
+        async_engine.sync_engine.dispose(close=False)
+        if async_replicas is not None:
+            async_replicas.dispose(close=False)
+
+def worker_exit(server, worker):
+    # Favorite changes still in the write-behind queue are committed before the worker goes away
+    if 'favorites' in sys.modules:
+        from favorites import favorite_queue
+        favorite_queue.close()
+
+def child_exit(server, worker):
+    # Drop the dead worker's live gauges; its counters stay in the totals
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
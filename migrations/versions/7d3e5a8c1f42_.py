@@ -0,0 +1,34 @@
+"""catalog tables: (column, primary key) indexes for filtering and sorting
+
+Revision ID: 7d3e5a8c1f42
+Revises: e4a1f6c09b2d
+Create Date: 2026-10-18 11:52:40.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3e5a8c1f42'
+down_revision = 'e4a1f6c09b2d'
+branch_labels = None
+depends_on = None
+
+FILTER_INDEXES = [
+    ('planets', 'planet_id', ['name', 'diameter', 'population', 'terrain']),
+    ('vehicles', 'vehicle_id', ['name', 'crew', 'model', 'cargo_capacity']),
+    ('characters', 'character_id', ['name', 'gender', 'skin_color', 'height']),
+]
+
+
+def upgrade():
+    for table, pk, columns in FILTER_INDEXES:
+        for column in columns:
+            op.create_index(f'ix_{table}_{column}_{pk}', table, [column, pk], unique=False)
+
+
+def downgrade():
+    for table, pk, columns in FILTER_INDEXES:
+        for column in reversed(columns):
+            op.drop_index(f'ix_{table}_{column}_{pk}', table_name=table)
@@ -0,0 +1,41 @@
+"""catalog tables: favorite_count counters with (favorite_count, primary key) indexes
+
+Revision ID: b81f0c6d2a95
+Revises: 7d3e5a8c1f42
+Create Date: 2026-10-18 12:06:12.904551
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81f0c6d2a95'
+down_revision = '7d3e5a8c1f42'
+branch_labels = None
+depends_on = None
+
+COUNTED_TABLES = [
+    ('planets', 'planet_id', 'favorite_planets'),
+    ('vehicles', 'vehicle_id', 'favorite_vehicles'),
+    ('characters', 'character_id', 'favorite_characters'),
+]
+
+
+def upgrade():
+    for table, pk, favorite_table in COUNTED_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('favorite_count', sa.Integer(), server_default='0', nullable=False))
+        # Backfill; `flask favorites reconcile` repairs any later drift
+        op.execute(
+            f'UPDATE {table} SET favorite_count = '
+            f'(SELECT COUNT(*) FROM {favorite_table} WHERE {favorite_table}.{pk} = {table}.{pk})'
+        )
+        op.create_index(f'ix_{table}_favorite_count_{pk}', table, ['favorite_count', pk], unique=False)
+
+
+def downgrade():
+    for table, pk, favorite_table in COUNTED_TABLES:
+        op.drop_index(f'ix_{table}_favorite_count_{pk}', table_name=table)
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('favorite_count')
@@ -0,0 +1,29 @@
+"""add name_changes, the log the search index follows
+
+Revision ID: c4f8a2d1e6b3
+Revises: b81f0c6d2a95
+Create Date: 2026-10-18 15:20:33.104872
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f8a2d1e6b3'
+down_revision = 'b81f0c6d2a95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('name_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('name_changes')
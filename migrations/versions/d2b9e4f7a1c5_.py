@@ -0,0 +1,46 @@
+"""admin search: indexes for prefix LIKE (text_pattern_ops on Postgres, COLLATE NOCASE on SQLite)
+
+Revision ID: d2b9e4f7a1c5
+Revises: c4f8a2d1e6b3
+Create Date: 2026-10-18 15:41:09.512630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2b9e4f7a1c5'
+down_revision = 'c4f8a2d1e6b3'
+branch_labels = None
+depends_on = None
+
+# Columns the admin searches with LIKE 'term%' (ADMIN_SEARCH_COLUMNS in src/admin.py).
+# Postgres only uses a btree for LIKE under the C collation or with
+# text_pattern_ops. SQLite's LIKE ignores case, so it only uses an index
+# declared COLLATE NOCASE. MySQL's default case-insensitive collations let
+# LIKE 'term%' use the existing (name, primary key) indexes
+PATTERN_INDEXES = [
+    ('user', 'user_name'),
+    ('user', 'email'),
+    ('planets', 'name'),
+    ('vehicles', 'name'),
+    ('characters', 'name'),
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table, column in PATTERN_INDEXES:
+        if dialect == 'postgresql':
+            op.create_index(f'ix_{table}_{column}_pattern', table, [column], unique=False,
+                            postgresql_ops={column: 'text_pattern_ops'})
+        elif dialect == 'sqlite':
+            op.execute(f'CREATE INDEX ix_{table}_{column}_pattern ON "{table}" ({column} COLLATE NOCASE)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name not in ('postgresql', 'sqlite'):
+        return
+    for table, column in reversed(PATTERN_INDEXES):
+        op.drop_index(f'ix_{table}_{column}_pattern', table_name=table)
@@ -0,0 +1,39 @@
+"""favorite tables: unique (user_id, entity_id) and entity_id indexes
+
+Revision ID: e4a1f6c09b2d
+Revises: 3c2b7e91d4f0
+Create Date: 2026-10-18 10:02:17.554963
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a1f6c09b2d'
+down_revision = '3c2b7e91d4f0'
+branch_labels = None
+depends_on = None
+
+FAVORITE_TABLES = [
+    ('favorite_planets', 'planet_id'),
+    ('favorite_characters', 'character_id'),
+    ('favorite_vehicles', 'vehicle_id'),
+]
+
+
+def upgrade():
+    for table, column in FAVORITE_TABLES:
+        # Drop duplicates left by the old check-then-insert handlers, keeping the oldest row
+        op.execute(
+            f'DELETE FROM {table} WHERE id NOT IN '
+            f'(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM {table} GROUP BY user_id, {column}) AS keep)'
+        )
+        op.create_index(f'ix_{table}_user_id_{column}', table, ['user_id', column], unique=True)
+        op.create_index(f'ix_{table}_{column}', table, [column], unique=False)
+
+
+def downgrade():
+    for table, column in FAVORITE_TABLES:
+        op.drop_index(f'ix_{table}_{column}', table_name=table)
+        op.drop_index(f'ix_{table}_user_id_{column}', table_name=table)
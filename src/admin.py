@@ -1,18 +1,254 @@
 import os
-from flask_admin import Admin
+import threading
+from flask import Flask, request
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
 from models import db, User,Planets,Characters,Vehicles,FavoritePlanets,FavoriteCharacters,FavoriteVehicles
-from flask_admin.contrib.sqla import ModelView
 
-def setup_admin(app):
+# Filtered admin lists count at most this many rows; the pager stops there
+ADMIN_COUNT_CAP = int(os.environ.get('ADMIN_COUNT_CAP', 10000))
+
+# Indexed columns the admin may search (by prefix) and filter on, per model
+ADMIN_SEARCH_COLUMNS = {
+    User: ('user_name', 'email'),
+    Planets: ('name',),
+    Vehicles: ('name',),
+    Characters: ('name',),
+}
+
+def scalable_views():
+    # Built on first use: ModelView subclasses need flask_admin, which is only
+    # imported once the admin itself is built
+    from flask_admin.contrib.sqla import ModelView
+    from flask_admin.contrib.sqla import filters as sqla_filters
+    from sqlalchemy import Integer, func, literal_column, or_, select
+    from sqlalchemy.orm import Query
+    from cache import response_cache
+    from favorites import adjust_favorite_counts
+    from filters import filter_columns
+    from pagination import table_total
+    from serializers import primary_key
+    from versioning import bump_versions, favorites_key
+
+    class CappedCountQuery(Query):
+        # Flask-Admin calls .scalar() on its count query once search and
+        # filters are applied. Unfiltered lists use the cheap table total (a
+        # planner estimate on Postgres); filtered ones count no further than
+        # the cap instead of scanning every match
+        model = None
+
+        def scalar(self):
+            if self.whereclause is None:
+                return table_total(self.model)[0]
+            capped = self.with_entities(literal_column('1')).limit(ADMIN_COUNT_CAP + 1).subquery()
+            return self.session.execute(select(func.count()).select_from(capped)).scalar()
+
+    def indexed_filters(model, columns):
+        # Equality (and ranges on integers) only: every filter maps to an index
+        # seek, unlike the default "contains"/"not equal" ILIKE-based operators
+        result = []
+        for column in columns:
+            if isinstance(column.type, Integer):
+                result += [sqla_filters.IntEqualFilter(column, column.key), sqla_filters.IntGreaterFilter(column, column.key),
+                           sqla_filters.IntSmallerFilter(column, column.key), sqla_filters.IntInListFilter(column, column.key)]
+            else:
+                result += [sqla_filters.FilterEqual(column, column.key), sqla_filters.FilterInList(column, column.key)]
+        return result
+
+    class ScalableModelView(ModelView):
+        # List views that stay fast on large tables:
+        #   - capped / estimated counts (CappedCountQuery)
+        #   - keyset "Next" links (?after=<pk>) instead of ever-growing OFFSETs
+        #   - prefix search and filters on indexed columns only
+        #   - relationships eager-loaded via column_select_related_list
+        # Writes get the API's bookkeeping: versions bumped in the write's own
+        # transaction, cached bodies dropped once it has committed
+        list_template = 'admin/keyset_list.html'
+        page_size = 50
+        column_display_pk = True
+
+        def __init__(self, model, session, **kwargs):
+            pk = primary_key(model)
+            searchable = [getattr(model, key) for key in ADMIN_SEARCH_COLUMNS.get(model, ())]
+            indexed = [pk] + list(filter_columns(model).values()) + self.extra_indexed_columns(model)
+            self.column_default_sort = pk.key
+            self.column_sortable_list = [column.key for column in indexed]
+            self.column_searchable_list = searchable
+            self.column_filters = indexed_filters(model, indexed)
+            super().__init__(model, session, **kwargs)
+
+        def extra_indexed_columns(self, model):
+            return []
+
+        def version_keys(self, model):
+            return [self.model.__tablename__]
+
+        def cache_keys(self, model):
+            return []
+
+        def on_model_change(self, form, model, is_created):
+            bump_versions(*self.version_keys(model))
+
+        def on_model_delete(self, model):
+            bump_versions(*self.version_keys(model))
+
+        def after_model_change(self, form, model, is_created):
+            keys = self.cache_keys(model)
+            if keys:
+                response_cache.delete(*keys)
+
+        def after_model_delete(self, model):
+            keys = self.cache_keys(model)
+            if keys:
+                response_cache.delete(*keys)
+
+        def get_count_query(self):
+            query = CappedCountQuery(func.count('*'), session=self.session()).select_from(self.model)
+            query.model = self.model
+            return query
+
+        def _apply_search(self, query, count_query, joins, count_joins, search):
+            # Prefix match, LIKE 'term%' bound as one literal (with %, _ and \
+            # in the term escaped), on each indexed column: an index range
+            # scan, where the default ILIKE '%term%' reads the whole table.
+            # Postgres uses the text_pattern_ops indexes and SQLite the
+            # COLLATE NOCASE ones from migration d2b9e4f7a1c5
+            term = search.strip()
+            if not term:
+                return query, count_query, joins, count_joins
+            pattern = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            clause = or_(*[
+                column.like(pattern, escape='\\')
+                for column in self.column_searchable_list
+            ])
+            query = query.filter(clause)
+            if count_query is not None:
+                count_query = count_query.filter(clause)
+            return query, count_query, joins, count_joins
+
+        def keyset_active(self):
+            return request.args.get('sort') is None
+
+        def _apply_pagination(self, query, page, page_size):
+            after = request.args.get('after', type=int)
+            if after is None or not self.keyset_active():
+                return super()._apply_pagination(query, page, page_size)
+            return query.filter(primary_key(self.model) > after).limit(page_size or self.page_size)
+
+        def keyset_url(self, data):
+            # "Next" link for the default (primary key) order: seeks past the last row shown
+            if not data or len(data) < self.page_size or not self.keyset_active():
+                return None
+            args = {key: value for key, value in request.args.items() if key not in ('page', 'after')}
+            args['after'] = getattr(data[-1], primary_key(self.model).key)
+            return self.get_url('.index_view', **args)
+
+    class UserView(ScalableModelView):
+        # The favorite backrefs would render every favorite row as a form option
+        form_excluded_columns = ('favorite_planets', 'favorite_characters', 'favorite_vehicles')
+
+        def cache_keys(self, model):
+            return [f'user:{model.id}']
+
+    class CatalogView(ScalableModelView):
+        # favorite_count is maintained by favorites.py, never edited by hand
+        form_excluded_columns = ('favorite_planets', 'favorite_characters', 'favorite_vehicles', 'favorite_count')
+
+        def extra_indexed_columns(self, model):
+            return [model.favorite_count]
+
+        def cache_keys(self, model):
+            # planet_id -> 'planet:<id>', as in @cached('planet:{planet_id}')
+            pk = primary_key(self.model).key
+            return [f'{pk[:-len("_id")]}:{getattr(model, pk)}']
+
+    class FavoriteView(ScalableModelView):
+        # The user and entity are joined into the list query instead of being
+        # lazy-loaded row by row, and the form looks them up over AJAX instead
+        # of rendering every user and entity as a select option.
+        # Favorites are added and removed, never edited, so each write moves
+        # exactly one favorite_count and one user's favorites version
+        can_edit = False
+
+        def __init__(self, model, session, entity, **kwargs):
+            self.entity_kind = entity
+            entity_relationship = f'{entity}_relationship'
+            self.column_list = ('id', 'user_relationship', entity_relationship)
+            self.column_select_related_list = ('user_relationship', entity_relationship)
+            self.column_labels = {'user_relationship': 'User', entity_relationship: entity.capitalize()}
+            self.form_ajax_refs = {
+                'user_relationship': {'fields': ('user_name', 'email'), 'page_size': 10},
+                entity_relationship: {'fields': ('name',), 'page_size': 10},
+            }
+            super().__init__(model, session, **kwargs)
+
+        def extra_indexed_columns(self, model):
+            return [model.user_id, getattr(model, f'{self.entity_kind}_id')]
+
+        def version_keys(self, model):
+            return [favorites_key(model.user_id)]
+
+        def on_model_change(self, form, model, is_created):
+            # The form sets the relationships; flushing fills in the ids
+            self.session.flush()
+            adjust_favorite_counts(self.entity_kind, [getattr(model, f'{self.entity_kind}_id')], 1, 1)
+            super().on_model_change(form, model, is_created)
+
+        def on_model_delete(self, model):
+            adjust_favorite_counts(self.entity_kind, [getattr(model, f'{self.entity_kind}_id')], -1, 1)
+            super().on_model_delete(model)
+
+    return UserView, CatalogView, FavoriteView
+
+def add_admin(app, url='/admin'):
+    # flask_admin is imported here, so processes that never serve /admin don't pay for it
+    from flask_admin import Admin
+    UserView, CatalogView, FavoriteView = scalable_views()
+
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
-    admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')
+    admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3', url=url)
 
     # Add your models here, for example this is how we add a the User model to the admin
-    admin.add_view(ModelView(User, db.session))
-    admin.add_view(ModelView(Planets, db.session))
-    admin.add_view(ModelView(Characters, db.session))
-    admin.add_view(ModelView(Vehicles, db.session))
-    admin.add_view(ModelView(FavoritePlanets, db.session))
-    admin.add_view(ModelView(FavoriteCharacters, db.session))
-    admin.add_view(ModelView(FavoriteVehicles, db.session))  
\ No newline at end of file
+    admin.add_view(UserView(User, db.session))
+    admin.add_view(CatalogView(Planets, db.session))
+    admin.add_view(CatalogView(Characters, db.session))
+    admin.add_view(CatalogView(Vehicles, db.session))
+    admin.add_view(FavoriteView(FavoritePlanets, db.session, 'planet'))
+    admin.add_view(FavoriteView(FavoriteCharacters, db.session, 'character'))
+    admin.add_view(FavoriteView(FavoriteVehicles, db.session, 'vehicle'))
+    return admin
+
+class LazyAdmin:
+    # WSGI app mounted at /admin that builds the real admin (a small Flask
+    # app of its own, on the same database) on its first request
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.app = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        admin_app = Flask(__name__)
+        admin_app.config.update({key: value for key, value in self.parent.config.items() if key.startswith('SQLALCHEMY_')})
+        db.init_app(admin_app)
+        add_admin(admin_app, url='/')
+        return admin_app
+
+    def __call__(self, environ, start_response):
+        if self.app is None:
+            with self._lock:
+                if self.app is None:
+                    self.app = self.build()
+        return self.app(environ, start_response)
+
+def admin_is_lazy():
+    return os.environ.get('ADMIN_LAZY', 'true').lower() in ('1', 'true', 'yes')
+
+def setup_admin(app):
+    # ADMIN_LAZY (on by default) defers all of Flask-Admin to the first /admin
+    # request, which keeps it off the boot path of every worker.
+    # ADMIN_LAZY=false registers it on the app at startup
+    if not admin_is_lazy():
+        add_admin(app)
+        return
+    app.wsgi_app = DispatcherMiddleware(app.wsgi_app, {'/admin': LazyAdmin(app)})
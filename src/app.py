@@ -3,16 +3,32 @@ This module takes care of starting the API Server, Loading the DB and Adding the
 """
 import os
 from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
+from sqlalchemy import select
+from utils import APIException, generate_sitemap, running_flask_cli
 from admin import setup_admin
+from json_provider import setup_json
+from cache import cached, response_cache, setup_cache
+from bulk import bulk_create
+from batch import run_batch
+from export import export_response
+from search import search_names
+from favorites import add_favorite, apply_favorite_batch, delete_favorite, popular, setup_favorite_commands, setup_favorite_queue
+from pool import engine_options, setup_pool_stats
+from replicas import read_only, setup_replicas
+from instrumentation import setup_instrumentation
+from metrics import setup_metrics
+from profiling import setup_profiling
+from pagination import keyset_page, page_body
+from filters import read_filters, read_ids, read_sort
+from versioning import bump_versions, versioned
+from serializers import read_fields, rows_response, rows_to_dicts, select_favorites, select_fields
 from models import db, User
 from models import db, User,Planets,Characters,Vehicles,FavoritePlanets,FavoriteCharacters,FavoriteVehicles
 
 app = Flask(__name__)
 app.url_map.strict_slashes = False
+setup_json(app)
 
 db_url = os.getenv("DATABASE_URL")
 if db_url is not None:
@@ -20,11 +36,23 @@ if db_url is not None:
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 
-MIGRATE = Migrate(app, db)
+# Flask-Migrate (and alembic under it) only serves the `flask db` commands; servers skip the import
+if running_flask_cli():
+    from flask_migrate import Migrate
+    MIGRATE = Migrate(app, db)
 db.init_app(app)
 CORS(app)
 setup_admin(app)
+setup_cache(app)
+setup_pool_stats(app)
+setup_replicas(app)
+setup_instrumentation(app)
+setup_metrics(app)
+setup_profiling(app)
+setup_favorite_commands(app)
+setup_favorite_queue(app)
 
 # Handle/serialize errors like a JSON object
 @app.errorhandler(APIException)
@@ -34,29 +62,28 @@ def handle_invalid_usage(error):
 # generate sitemap with all your endpoints
 @app.route('/')
 def sitemap():
-    return generate_sitemap(app)
+    return SITEMAP
 
 @app.route('/user', methods=['GET'])
+@versioned('user')
 def get_all_users():
-    all_users = User.query.all()
-    all_users_serialize = []
-
-    for user in all_users:
-        all_users_serialize.append(user.serialize())
-
-    response_body = {
-        "msg": "Hello, this is your GET /user response to see all the users",
-        "data": all_users_serialize
-    }
-    return jsonify(response_body), 200
+    fields = read_fields(User)
+    conditions = read_ids(User)
+    all_users, next_url = keyset_page(select_fields(User, fields).where(*conditions), User.id)
+    response_body = page_body("Hello, this is your GET /user response to see all the users",
+                              next_url, User, conditions)
+    return rows_response(response_body, fields, all_users), 200
 
 @app.route('/user/<int:user_id>', methods=['GET'])
+@cached('user:{user_id}')
+@versioned('user')
 def get_single_user(user_id):
-    single_user = User.query.get(user_id)
+    fields = read_fields(User)
+    single_user = db.session.execute(select_fields(User, fields).where(User.id == user_id)).first()
     if single_user == None:
         return jsonify({'msg': f'User with id: {user_id} doesn\'t exist'} ),404
     return jsonify({'msg':'ok',
-                    'data': single_user.serialize()}),200
+                    'data': dict(single_user._mapping)}),200
 
 @app.route('/user', methods=['POST'])
 def create_user():
@@ -68,7 +95,9 @@ def create_user():
     if existing_user:
         if not existing_user.is_active:
             existing_user.is_active = True
+            bump_versions('user')
             db.session.commit()
+            response_cache.delete(f'user:{existing_user.id}')
             return jsonify({'msg': 'User successfully reactivated', 'data': existing_user.serialize()}), 200
         else:
             return jsonify({'msg': 'This email is already in use by an active user'}), 409
@@ -81,6 +110,7 @@ def create_user():
     )
     try:
         db.session.add(new_user)
+        bump_versions('user')
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -100,11 +130,13 @@ def deactivate_user(user_id):
     user_to_deactivate.is_active = False
 
     try:
+        bump_versions('user')
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({'msg': 'Error erasing user', 'error': str(e)}), 500
 
+    response_cache.delete(f'user:{user_id}')
     return jsonify({'msg': f'User with id: {user_id} deactivated'}), 200
 
 @app.route('/user/<int:user_id>', methods=['PUT'])
@@ -129,35 +161,30 @@ def update_user(user_id):
     user_to_update.user_name = user_data['user_name']
 
     try:
+        bump_versions('user')
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({'msg': 'Error al actualizar el usuario', 'error': str(e)}), 500
 
+    response_cache.delete(f'user:{user_id}')
     return jsonify({'msg': f'Usuario con id {user_id} actualizado exitosamente', 'data': user_to_update.serialize()}), 200
 
 @app.route('/user/<int:id_user>/favorites', methods=['GET'])
+@versioned('favorites:{id_user}', 'user', 'planets', 'vehicles', 'characters')
 def get_favorites(id_user):
 
-    user = User.query.get(id_user)
+    user = db.session.execute(select(User.id).where(User.id == id_user)).first()
     if user is None:
         return jsonify({'msg': f'User with id: {id_user} doesn\'t exist'}), 404
-    
-    favorite_planets = FavoritePlanets.query.filter_by(user_id=id_user).all()
-    favorite_vehicles = FavoriteVehicles.query.filter_by(user_id=id_user).all()
-    favorite_characters = FavoriteCharacters.query.filter_by(user_id=id_user).all()
 
-    favorite_planets_serialize = []
-    for fav in favorite_planets:
-        favorite_planets_serialize.append(fav.planet_relationship.serialize())
-    
-    favorite_characters_serialize = []
-    for fav in favorite_characters:
-        favorite_characters_serialize.append(fav.character_relationship.serialize())
-    
-    favorite_vehicles_serialize = []
-    for fav in favorite_vehicles:
-        favorite_vehicles_serialize.append(fav.vehicle_relationship.serialize())
+    favorite_planets = db.session.execute(select_favorites(FavoritePlanets, Planets, id_user)).all()
+    favorite_vehicles = db.session.execute(select_favorites(FavoriteVehicles, Vehicles, id_user)).all()
+    favorite_characters = db.session.execute(select_favorites(FavoriteCharacters, Characters, id_user)).all()
+
+    favorite_planets_serialize = rows_to_dicts(favorite_planets)
+    favorite_characters_serialize = rows_to_dicts(favorite_characters)
+    favorite_vehicles_serialize = rows_to_dicts(favorite_vehicles)
 
     return jsonify({
         'a_msg': f'All the favorites from user id: {id_user} are those:',
@@ -168,30 +195,39 @@ def get_favorites(id_user):
         }
     }), 200
 
+@app.route('/user/<int:id_user>/favorites', methods=['PATCH'])
+def update_favorites(id_user):
+    # Adds and removes favorites of every kind in one transaction, with a result per item
+    response_body, status = apply_favorite_batch(id_user, request.get_json(silent=True))
+    return jsonify(response_body), status
+
 
 # PLANETS
 
 @app.route('/planets', methods=['GET'])
+@versioned('planets')
 def get_all_planets():
 
-    all_planets = Planets.query.all()
+    fields = read_fields(Planets)
+    conditions = read_filters(Planets)
+    all_planets, next_url = keyset_page(select_fields(Planets, fields).where(*conditions), Planets.planet_id, read_sort(Planets))
 
-    all_planets_serialize = [planet.serialize() for planet in all_planets]
-    response_body = {
-        "msg": "Hello, this is your GET /planets response to see all the planets",
-        "data": all_planets_serialize
-    }
-    return jsonify(response_body), 200
+    response_body = page_body("Hello, this is your GET /planets response to see all the planets",
+                              next_url, Planets, conditions)
+    return rows_response(response_body, fields, all_planets), 200
 
 @app.route('/planet/<int:planet_id>', methods=['GET'])
+@cached('planet:{planet_id}')
+@versioned('planets')
 def get_single_planet(planet_id):
-    # Retrieve a single planet by its ID
-    single_planet = Planets.query.get(planet_id)
+    # Retrieve a single planet by its ID, selecting only the requested columns
+    fields = read_fields(Planets)
+    single_planet = db.session.execute(select_fields(Planets, fields).where(Planets.planet_id == planet_id)).first()
     if single_planet is None:
         return jsonify({'msg': f'Planet with id: {planet_id} doesn\'t exist'}), 404
     return jsonify({
         'msg': 'Hello, this is your GET /planet response to see one singular planet',
-        'data': single_planet.serialize()
+        'data': dict(single_planet._mapping)
     }), 200
 
 @app.route('/planet', methods=['POST'])
@@ -217,6 +253,7 @@ def add_planet():
         terrain=body['terrain']
     )
     db.session.add(new_planet)
+    bump_versions('planets')
     db.session.commit()
 
     return jsonify({
@@ -224,6 +261,12 @@ def add_planet():
         'data': new_planet.serialize()
     }), 201
 
+@app.route('/planets/bulk', methods=['POST'])
+def add_planets_bulk():
+    response_body, status = bulk_create(Planets, Planets.planet_id,
+                                        ['name', 'diameter', 'population', 'duration_day', 'terrain'], 'planet')
+    return jsonify(response_body), status
+
 @app.route('/planet/<int:planet_id>', methods=['PUT'])
 def update_planet(planet_id):
     body = request.get_json(silent=True)
@@ -246,7 +289,9 @@ def update_planet(planet_id):
     planet.duration_day = body['duration_day']
     planet.terrain = body['terrain']
     
+    bump_versions('planets')
     db.session.commit()
+    response_cache.delete(f'planet:{planet_id}')
     return jsonify({
         'msg': f'Planet with id: {planet_id} modified!',
         'data': planet.serialize()
@@ -265,87 +310,48 @@ def delete_planet(planet_id):
     
 
     db.session.delete(planet)
+    bump_versions('planets')
     db.session.commit()
     
+    response_cache.delete(f'planet:{planet_id}')
     return jsonify({'msg': f'Planet with id: {planet_id} erased'}), 200
 
 
 @app.route('/favorite/planet/<int:planet_id>/<int:user_id>', methods=['POST'])
 def add_favorite_planet(planet_id, user_id):
-   
-    user = User.query.get(user_id)
-    planet = Planets.query.get(planet_id)
-    
-    if user is None:
-        return jsonify({'msg': f'User with id: {user_id} doesn\'t exist'}), 404
-    if not user.is_active:
-        return jsonify({'msg': f'User with id: {user_id} is deactivated'}), 409
-    if planet is None:
-        return jsonify({'msg': f'Planet with id: {planet_id} doesn\'t exist'}), 404
-    
-    # Check if the user already has this planet as a favorite
-    existing_favorite = FavoritePlanets.query.filter_by(user_id=user_id, planet_id=planet_id).first()
-    if existing_favorite:
-        return jsonify({'msg': f'Planet with id: {planet_id} is already a favorite for user with id: {user_id}'}), 409
-    
-    # Create a new favorite relationship
-    new_relationship = FavoritePlanets(
-        user_id=user_id,
-        planet_id=planet_id
-    )
-    db.session.add(new_relationship)
-    db.session.commit()
-
-    return jsonify({'msg': f'Planet with id: {planet_id} added as favorite for user with id: {user_id}'}), 200
+    response_body, status = add_favorite('planet', planet_id, user_id)
+    return jsonify(response_body), status
 
 
 @app.route('/favorite/planet/<int:planet_id>/<int:user_id>', methods=['DELETE'])
 def delete_favorite_planet(planet_id, user_id):
-    # Retrieve the user and planet by their IDs
-    user = User.query.get(user_id)
-    planet = Planets.query.get(planet_id)
-    
-    if user is None:
-        return jsonify({'msg': f'User with id: {user_id} doesn\'t exist'}), 404
-    if not user.is_active:
-        return jsonify({'msg': f'User with id: {user_id} is deactivated'}), 409
-    if planet is None:
-        return jsonify({'msg': f'Planet with id: {planet_id} doesn\'t exist'}), 404
-    
-
-    existing_favorite = FavoritePlanets.query.filter_by(user_id=user_id, planet_id=planet_id).first()
-    if existing_favorite is None:
-        return jsonify({'msg': f'Favorite relationship between user id: {user_id} and planet id: {planet_id} doesn\'t exist'}), 404
-    
-
-    db.session.delete(existing_favorite)
-    db.session.commit()
-
-    return jsonify({'msg': f'Planet with id: {planet_id} deleted from favorites for user with id: {user_id}'}), 200
+    response_body, status = delete_favorite('planet', planet_id, user_id)
+    return jsonify(response_body), status
 
 
 # VEHICLES
 
 @app.route('/vehicles', methods=['GET'])
+@versioned('vehicles')
 def get_all_vehicles():
-    all_vehicles = Vehicles.query.all()
-    all_vehicles_serialize = []
-    for vehicle in all_vehicles:
-        all_vehicles_serialize.append(vehicle.serialize())
-    response_body = {
-        "msg": "Hello, this is your GET /vehicles response to see all the vehicles",
-        "data": all_vehicles_serialize
-    }
-    return jsonify(response_body), 200
+    fields = read_fields(Vehicles)
+    conditions = read_filters(Vehicles)
+    all_vehicles, next_url = keyset_page(select_fields(Vehicles, fields).where(*conditions), Vehicles.vehicle_id, read_sort(Vehicles))
+    response_body = page_body("Hello, this is your GET /vehicles response to see all the vehicles",
+                              next_url, Vehicles, conditions)
+    return rows_response(response_body, fields, all_vehicles), 200
 
 @app.route('/vehicle/<int:vehicle_id>', methods=['GET'])
+@cached('vehicle:{vehicle_id}')
+@versioned('vehicles')
 def get_single_vehicle(vehicle_id):
-    single_vehicle = Vehicles.query.get(vehicle_id)
+    fields = read_fields(Vehicles)
+    single_vehicle = db.session.execute(select_fields(Vehicles, fields).where(Vehicles.vehicle_id == vehicle_id)).first()
     if single_vehicle is None:
         return jsonify({'msg': f'Vehicle with id: {vehicle_id} doesn\'t exist'}), 404
     return jsonify({
         'msg': 'Hello, this is your GET /vehicle response to see one singular vehicle',
-        'data': single_vehicle.serialize()
+        'data': dict(single_vehicle._mapping)
     }), 200
 
 @app.route('/vehicle', methods=['POST'])
@@ -367,6 +373,7 @@ def add_vehicle():
     )
     
     db.session.add(new_vehicle)
+    bump_versions('vehicles')
     db.session.commit()
 
     return jsonify({
@@ -374,6 +381,12 @@ def add_vehicle():
         'data': new_vehicle.serialize()
     }), 201
 
+@app.route('/vehicles/bulk', methods=['POST'])
+def add_vehicles_bulk():
+    response_body, status = bulk_create(Vehicles, Vehicles.vehicle_id,
+                                        ['name', 'crew', 'model', 'lenght', 'cargo_capacity'], 'vehicle')
+    return jsonify(response_body), status
+
 @app.route('/vehicle/<int:vehicle_id>', methods=['PUT'])
 def update_vehicle(vehicle_id):
     body = request.get_json(silent=True)
@@ -391,7 +404,9 @@ def update_vehicle(vehicle_id):
     vehicle.lenght = body['lenght']
     vehicle.cargo_capacity = body['cargo_capacity']
     
+    bump_versions('vehicles')
     db.session.commit()
+    response_cache.delete(f'vehicle:{vehicle_id}')
     return jsonify({
         'msg': f'Vehicle with Id: {vehicle_id} modified!',
         'data': vehicle.serialize()
@@ -408,81 +423,48 @@ def delete_vehicle(vehicle_id):
         return jsonify({'msg': f'Please delete the favorite relationships for vehicle with id: {vehicle_id} before deleting the vehicle'}), 400
     
     db.session.delete(vehicle)
+    bump_versions('vehicles')
     db.session.commit()
     
+    response_cache.delete(f'vehicle:{vehicle_id}')
     return jsonify({'msg': f'Vehicle with id: {vehicle_id} deleted'}), 200
 
 
 @app.route('/favorite/vehicle/<int:vehicle_id>/<int:user_id>', methods=['POST'])
 def add_favorite_vehicle(vehicle_id, user_id):
-    user = User.query.get(user_id)
-    vehicle = Vehicles.query.get(vehicle_id)
-    
-    if user is None:
-        return jsonify({'msg': f'User with id: {user_id} doesn\'t exist'}), 404
-    if user.is_active == False:
-        return jsonify({'msg': f'User with id: {user_id} is deactivated'}), 409
-    if vehicle is None:
-        return jsonify({'msg': f'Vehicle with id: {vehicle_id} doesn\'t exist'}), 404
-    
-    existing_favorite = FavoriteVehicles.query.filter_by(user_id=user_id, vehicle_id=vehicle_id).first()
-    if existing_favorite:
-        return jsonify({'msg': f'Vehicle with id: {vehicle_id} is already a favorite for user with id: {user_id}'}), 409
-    
-    new_relationship = FavoriteVehicles(
-        user_id=user_id,
-        vehicle_id=vehicle_id
-    )
-    db.session.add(new_relationship)
-    db.session.commit()
-
-    return jsonify({'msg': f'Vehicle with id: {vehicle_id} added as favorite for user with id: {user_id}'}), 200
+    response_body, status = add_favorite('vehicle', vehicle_id, user_id)
+    return jsonify(response_body), status
 
 
 @app.route('/favorite/vehicle/<int:vehicle_id>/<int:user_id>', methods=['DELETE'])
 def delete_favorite_vehicle(vehicle_id, user_id):
-    user = User.query.get(user_id)
-    vehicle = Vehicles.query.get(vehicle_id)
-    
-    if user is None:
-        return jsonify({'msg': f'User with id: {user_id} doesn\'t exist'}), 404
-    if user.is_active == False:
-        return jsonify({'msg': f'User with id: {user_id} is deactivated'}), 409
-    if vehicle is None:
-        return jsonify({'msg': f'Vehicle with id: {vehicle_id} doesn\'t exist'}), 404
-    
-    existing_favorite = FavoriteVehicles.query.filter_by(user_id=user_id, vehicle_id=vehicle_id).first()
-    if existing_favorite is None:
-        return jsonify({'msg': f'Favorite relationship between user id: {user_id} and vehicle id: {vehicle_id} doesn\'t exist'}), 404
-    
-    db.session.delete(existing_favorite)
-    db.session.commit()
-
-    return jsonify({'msg': f'Vehicle with id: {vehicle_id} deleted from favorites for user with id: {user_id}'}), 200
+    response_body, status = delete_favorite('vehicle', vehicle_id, user_id)
+    return jsonify(response_body), status
 
 
 # CHARACTERS
 
 @app.route('/characters', methods=['GET'])
+@versioned('characters')
 def get_all_characters():
-    all_characters = Characters.query.all()
-    all_characters_serialize = []
-    for character in all_characters:
-        all_characters_serialize.append(character.serialize())
-    response_body = {
-        "msg": "Hello, this is your GET /characters response to see all the characters",
-        "data": all_characters_serialize
-    }
-    return jsonify(response_body), 200
+    fields = read_fields(Characters)
+    conditions = read_filters(Characters)
+    all_characters, next_url = keyset_page(select_fields(Characters, fields).where(*conditions), Characters.character_id, read_sort(Characters))
+    response_body = page_body("Hello, this is your GET /characters response to see all the characters",
+                              next_url, Characters, conditions)
+    return rows_response(response_body, fields, all_characters), 200
 
 @app.route('/character/<int:character_id>', methods=['GET'])
+@cached('character:{character_id}')
+@versioned('characters')
 def get_single_character(character_id):
-    single_character = Characters.query.get(character_id)
+    fields = read_fields(Characters)
+    single_character = db.session.execute(select_fields(Characters, fields).where(Characters.character_id == character_id)).first()
     if single_character is None:
         return jsonify({'msg': f'Character with id: {character_id} doesn\'t exist'}), 404
     return jsonify({
         'msg': 'Hello, this is your GET /character response to see one singular character',
-        'data': single_character.serialize()
+        'data': dict(single_character._mapping)
     }), 200
 
 @app.route('/character', methods=['POST'])
@@ -504,6 +486,7 @@ def add_character():
     )
     
     db.session.add(new_character)
+    bump_versions('characters')
     db.session.commit()
 
     return jsonify({
@@ -511,6 +494,12 @@ def add_character():
         'data': new_character.serialize()
     }), 201
 
+@app.route('/characters/bulk', methods=['POST'])
+def add_characters_bulk():
+    response_body, status = bulk_create(Characters, Characters.character_id,
+                                        ['name', 'skin_color', 'birth_year', 'gender', 'height'], 'character')
+    return jsonify(response_body), status
+
 @app.route('/character/<int:character_id>', methods=['PUT'])
 def update_character(character_id):
     body = request.get_json(silent=True)
@@ -528,7 +517,9 @@ def update_character(character_id):
     character.gender = body['gender']
     character.height = body['height']
     
+    bump_versions('characters')
     db.session.commit()
+    response_cache.delete(f'character:{character_id}')
     return jsonify({
         'msg': f'Character with Id: {character_id} modified!',
         'data': character.serialize()
@@ -541,58 +532,63 @@ def delete_character(character_id):
         return jsonify({'msg': f'Character with id: {character_id} doesn\'t exist'}), 404
 
     db.session.delete(character)
+    bump_versions('characters')
     db.session.commit()
     
+    response_cache.delete(f'character:{character_id}')
     return jsonify({'msg': f'Character with id: {character_id} deleted'}), 200
 
 # Post Favorite Character
 @app.route('/favorite/character/<int:character_id>/<int:user_id>', methods=['POST'])
 def add_favorite_character(character_id, user_id):
-    user = User.query.get(user_id)
-    character = Characters.query.get(character_id)
-    
-    if user is None:
-        return jsonify({'msg': f'User with id: {user_id} doesn\'t exist'}), 404
-    if user.is_active == False:
-        return jsonify({'msg': f'User with id: {user_id} is deactivated'}), 409
-    if character is None:
-        return jsonify({'msg': f'Character with id: {character_id} doesn\'t exist'}), 404
-    
-    existing_favorite = FavoriteCharacters.query.filter_by(user_id=user_id, character_id=character_id).first()
-    if existing_favorite:
-        return jsonify({'msg': f'Character with id: {character_id} is already a favorite for user with id: {user_id}'}), 409
-    
-    new_relationship = FavoriteCharacters(
-        user_id=user_id,
-        character_id=character_id
-    )
-    db.session.add(new_relationship)
-    db.session.commit()
-
-    return jsonify({'msg': f'Character with id: {character_id} added as favorite for user with id: {user_id}'}), 200
+    response_body, status = add_favorite('character', character_id, user_id)
+    return jsonify(response_body), status
 
 # Delete Favorite Character
 @app.route('/favorite/character/<int:character_id>/<int:user_id>', methods=['DELETE'])
 def delete_favorite_character(character_id, user_id):
-    user = User.query.get(user_id)
-    character = Characters.query.get(character_id)
-    
-    if user is None:
-        return jsonify({'msg': f'User with id: {user_id} doesn\'t exist'}), 404
-    if user.is_active == False:
-        return jsonify({'msg': f'User with id: {user_id} is deactivated'}), 409
-    if character is None:
-        return jsonify({'msg': f'Character with id: {character_id} doesn\'t exist'}), 404
-    
-    existing_favorite = FavoriteCharacters.query.filter_by(user_id=user_id, character_id=character_id).first()
-    if existing_favorite is None:
-        return jsonify({'msg': f'Favorite relationship between user id: {user_id} and character id: {character_id} doesn\'t exist'}), 404
-    
-    db.session.delete(existing_favorite)
-    db.session.commit()
+    response_body, status = delete_favorite('character', character_id, user_id)
+    return jsonify(response_body), status
+
+
+# POPULAR
+
+@app.route('/popular/<string:kind>', methods=['GET'])
+def get_popular(kind):
+    # Most favorited planets, vehicles or characters: /popular/planets?limit=10
+    response_body, status = popular(kind)
+    return jsonify(response_body), status
+
+
+# SEARCH
+
+@app.route('/search', methods=['GET'])
+@versioned('planets', 'vehicles', 'characters')
+def search():
+    # Ranked name matches across planets, vehicles and characters: ?q=sky&limit=20
+    return search_names(), 200
+
+
+# EXPORT
+
+@app.route('/export/<string:table>', methods=['GET'])
+def export_table(table):
+    # Streams the whole table as NDJSON; resume an interrupted dump with ?after=<last primary key>
+    return export_response(table)
+
+
+# BATCH
+
+@app.route('/batch', methods=['POST'])
+@read_only
+def batch():
+    # Several GETs in one round trip: {"requests": ["/planet/1", "/vehicles?ids=1,2,3"]}
+    response_body, status = run_batch(request.get_json(silent=True))
+    return jsonify(response_body), status
 
-    return jsonify({'msg': f'Character with id: {character_id} deleted from favorites for user with id: {user_id}'}), 200
 
+# Built once, after every route above is registered
+SITEMAP = generate_sitemap(app)
 
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
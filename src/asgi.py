@@ -0,0 +1,164 @@
+# Async entry point, an alternative to wsgi.py:
+#     uvicorn asgi:application --app-dir src/
+# Every route of the Flask app is served, but database I/O goes through an
+# async engine, so one process keeps many requests in flight while they wait
+# on the database. The Flask views run unchanged inside AsyncSession.run_sync,
+# where SQLAlchemy bridges their sync calls onto the event loop with greenlets,
+# so both modes produce the same responses from the same code.
+
+import asyncio
+import io
+import os
+import sys
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.util import await_only
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from app import app
+from models import db
+from pool import engine_options, track_connection_events
+from replicas import AsyncRoutingSession, ReplicaSet, replica_urls
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+    'mysql': 'mysql+aiomysql',
+}
+
+def async_url(database_uri):
+    url = make_url(database_uri)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+def async_database_url(database_uri):
+    # ASYNC_DATABASE_URL wins; otherwise swap the driver of the sync URL
+    if os.environ.get('ASYNC_DATABASE_URL'):
+        return os.environ['ASYNC_DATABASE_URL']
+    return async_url(database_uri)
+
+database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+async_engine = create_async_engine(async_database_url(database_uri), **engine_options(database_uri, asynchronous=True))
+track_connection_events(async_engine.sync_engine)
+
+# Read replicas get async engines of their own, routed like the sync ones (replicas.py)
+async_replica_engines = [create_async_engine(async_url(url), **engine_options(url, asynchronous=True)) for url in replica_urls()]
+for engine in async_replica_engines:
+    track_connection_events(engine.sync_engine)
+async_replicas = ReplicaSet([engine.sync_engine for engine in async_replica_engines],
+                            retry_seconds=float(os.environ.get('REPLICA_RETRY_SECONDS', 30))) if async_replica_engines else None
+
+def build_environ(scope, body):
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f'HTTP/{scope["http_version"]}',
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        # The whole body has been read, so a chunked request (no
+        # Content-Length) still exposes it to request.get_data()
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            environ[name] = value
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+def dispatch(sync_session, environ, send):
+    # Runs in a greenlet: the request context is pushed here, and the
+    # request's db.session is the async session's sync facade
+    with app.request_context(environ):
+        db.session.registry.set(sync_session)
+        try:
+            response = app.full_dispatch_request()
+        except Exception as e:
+            response = app.make_response(app.handle_exception(e))
+
+        try:
+            await_only(send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in response.headers.items()],
+            }))
+            # Streamed responses (e.g. /export) are sent chunk by chunk, still inside the request context
+            for chunk in response.iter_encoded():
+                await_only(send({'type': 'http.response.body', 'body': chunk, 'more_body': True}))
+            await_only(send({'type': 'http.response.body', 'body': b'', 'more_body': False}))
+        finally:
+            response.close()
+
+def mounted_path(path):
+    # Apps mounted in front of Flask (the lazy admin) are plain WSGI apps on the sync engine
+    mounts = app.wsgi_app.mounts if isinstance(app.wsgi_app, DispatcherMiddleware) else {}
+    return any(path == prefix or path.startswith(prefix + '/') for prefix in mounts)
+
+async def serve_wsgi(environ, send):
+    # Runs the whole WSGI stack in a worker thread so its blocking I/O stays off the event loop
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+
+    def run():
+        body = app.wsgi_app(environ, start_response)
+        try:
+            return b''.join(body)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+    body = await asyncio.to_thread(run)
+    await send({
+        'type': 'http.response.start',
+        'status': started['status'],
+        'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in started['headers']],
+    })
+    await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+
+async def read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_engine.dispose()
+            for engine in async_replica_engines:
+                await engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    environ = build_environ(scope, await read_body(receive))
+    if mounted_path(scope['path']):
+        return await serve_wsgi(environ, send)
+    async with AsyncSession(async_engine, sync_session_class=AsyncRoutingSession, replicas=async_replicas) as session:
+        await session.run_sync(dispatch, environ, send)
@@ -0,0 +1,80 @@
+import io
+from urllib.parse import urlsplit
+from flask import current_app, request
+from werkzeug.exceptions import HTTPException
+from models import db
+
+MAX_BATCH_REQUESTS = 50
+
+# Conditional and body headers of the batch request itself never reach its sub-requests
+DROPPED_ENVIRON_KEYS = ('CONTENT_TYPE', 'CONTENT_LENGTH', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MATCH')
+
+def read_batch_paths(body):
+    # {"requests": ["/planet/1", {"path": "/vehicles?ids=1,2"}]} -> ['/planet/1', '/vehicles?ids=1,2']
+    items = body.get('requests') if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, 'You must send a non-empty "requests" list in the body'
+    if len(items) > MAX_BATCH_REQUESTS:
+        return None, f'A batch can carry at most {MAX_BATCH_REQUESTS} requests'
+    paths = []
+    for item in items:
+        if isinstance(item, dict):
+            if item.get('method', 'GET').upper() != 'GET':
+                return None, 'Only GET sub-requests can be batched'
+            item = item.get('path')
+        if not isinstance(item, str) or not item.startswith('/') or item.startswith('//'):
+            return None, 'Each request must be a path such as "/planet/1", or an object with a "path"'
+        paths.append(item)
+    return paths, None
+
+def sub_environ(path):
+    url = urlsplit(path)
+    environ = {key: value for key, value in request.environ.items() if key not in DROPPED_ENVIRON_KEYS}
+    environ.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'wsgi.input': io.BytesIO(b''),
+    })
+    return environ
+
+def dispatch(app, path):
+    # The sub-request gets a request context of its own inside the batch's app
+    # context, so it shares g and db.session (one session, and one replica
+    # when replicas are configured). Only the view runs: the before/after
+    # request hooks already run once for the batch
+    with app.request_context(sub_environ(path)):
+        try:
+            rv = app.dispatch_request()
+        except HTTPException as e:
+            # e.g. 404 for an unknown path, or 405 for a POST-only route such as /batch itself
+            rv = app.handle_http_exception(e)
+            if isinstance(rv, HTTPException):
+                rv = rv.get_response()
+        except Exception as e:
+            try:
+                rv = app.handle_user_exception(e)
+            except Exception:
+                # No handler for it: only this item fails, and the shared
+                # session is rolled back so the next items start clean
+                app.logger.exception('Batch sub-request %s failed', path)
+                db.session.rollback()
+                return {'path': path, 'status': 500, 'body': {'msg': 'Internal server error'}}
+        response = app.make_response(rv)
+        try:
+            if response.is_streamed:
+                return {'path': path, 'status': 400, 'body': {'msg': 'Streamed responses can\'t be batched'}}
+            body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+            return {'path': path, 'status': response.status_code, 'body': body}
+        finally:
+            response.close()
+
+def run_batch(body):
+    paths, error = read_batch_paths(body)
+    if error:
+        return {'msg': error}, 400
+    app = current_app._get_current_object()
+    results = [dispatch(app, path) for path in paths]
+    failed = sum(1 for result in results if result['status'] >= 400)
+    status = 200 if not failed else 207
+    return {'msg': f'{len(results) - failed} of {len(results)} requests succeeded', 'data': results}, status
@@ -0,0 +1,122 @@
+import json
+from flask import request
+from sqlalchemy import Integer, String, insert, select
+from models import db
+from search import record_name_changes
+from utils import APIException, IN_CHUNK_SIZE, INTEGER_MIN, INTEGER_MAX
+from versioning import bump_versions
+
+MAX_BULK_ROWS = 10000
+
+def read_bulk_rows():
+    # Accepts a JSON array, or NDJSON (one object per line) for large payloads.
+    # Lines that fail to parse are kept as None so they get their own row status
+    if request.mimetype == 'application/x-ndjson':
+        rows = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                rows.append(None)
+    else:
+        rows = request.get_json(silent=True)
+        if not isinstance(rows, list):
+            raise APIException('You must send a JSON array (or application/x-ndjson) in the body', status_code=400)
+
+    if not rows:
+        raise APIException('You must send at least one row', status_code=400)
+    if len(rows) > MAX_BULK_ROWS:
+        raise APIException(f'A bulk request can carry at most {MAX_BULK_ROWS} rows', status_code=413)
+    return rows
+
+def existing_names(model, names):
+    found = set()
+    names = list(names)
+    for start in range(0, len(names), IN_CHUNK_SIZE):
+        chunk = names[start:start + IN_CHUNK_SIZE]
+        found.update(db.session.execute(select(model.name).where(model.name.in_(chunk))).scalars())
+    return found
+
+def ids_by_name(model, pk_column, names):
+    ids = {}
+    names = list(names)
+    for start in range(0, len(names), IN_CHUNK_SIZE):
+        chunk = names[start:start + IN_CHUNK_SIZE]
+        ids.update(db.session.execute(select(model.name, pk_column).where(model.name.in_(chunk))).all())
+    return ids
+
+def field_error(column, field, value):
+    # Checks a value against its column up front, so a bad row fails alone with
+    # a 400 instead of failing the whole insert with a 500
+    if value is None:
+        return None if column.nullable else f'Field "{field}" can\'t be null'
+    if isinstance(column.type, Integer):
+        if not isinstance(value, int) or isinstance(value, bool):
+            return f'Field "{field}" must be an integer'
+        if not INTEGER_MIN <= value <= INTEGER_MAX:
+            return f'Field "{field}" is out of range'
+    elif isinstance(column.type, String):
+        if not isinstance(value, str):
+            return f'Field "{field}" must be a string'
+        if column.type.length is not None and len(value) > column.type.length:
+            return f'Field "{field}" can be at most {column.type.length} characters long'
+    return None
+
+def row_error(model, row, required_fields):
+    if not isinstance(row, dict):
+        return 'Each row must be a JSON object'
+    if not all(field in row for field in required_fields):
+        fields = ', '.join(f'"{field}"' for field in required_fields)
+        return f'Fields {fields} are mandatory'
+    columns = model.__table__.columns
+    for field in required_fields:
+        error = field_error(columns[field], field, row[field])
+        if error:
+            return error
+    return None
+
+def bulk_create(model, pk_column, required_fields, label):
+    rows = read_bulk_rows()
+    results = [None] * len(rows)
+    candidates = {}
+
+    # Validate every row before touching the database
+    for index, row in enumerate(rows):
+        error = row_error(model, row, required_fields)
+        if error:
+            results[index] = {'index': index, 'status': 400, 'msg': error}
+        elif row['name'] in candidates:
+            results[index] = {'index': index, 'status': 400, 'msg': f'Duplicate {label} name in this batch (see row {candidates[row["name"]]})'}
+        else:
+            candidates[row['name']] = index
+
+    for name in existing_names(model, candidates):
+        index = candidates.pop(name)
+        results[index] = {'index': index, 'status': 400, 'msg': f'A {label} with this name already exists'}
+
+    if candidates:
+        values = [{field: rows[index][field] for field in required_fields} for index in candidates.values()]
+        try:
+            # One executemany in one transaction instead of a commit per row
+            db.session.execute(insert(model), values)
+            new_ids = ids_by_name(model, pk_column, candidates)
+            record_name_changes(db.session.connection(), [(model.__tablename__, new_id) for new_id in new_ids.values()])
+            bump_versions(model.__tablename__)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return {'msg': f'Error creating the {label}s', 'error': str(e)}, 500
+
+        for name, index in candidates.items():
+            results[index] = {'index': index, 'status': 201, 'msg': 'created', pk_column.key: new_ids[name]}
+
+    created = len(candidates)
+    if created == len(rows):
+        status = 201
+    elif created:
+        status = 207
+    else:
+        status = 400
+    return {'msg': f'{created} of {len(rows)} {label}s created', 'data': results}, status
@@ -0,0 +1,190 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import g, jsonify, make_response, request
+from models import db
+from replicas import read_from_primary
+from versioning import current_versions
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    # Bounded, thread-safe in-process tier. Entries expire after `ttl` seconds
+    # so other workers' writes show up here within that window
+
+    def __init__(self, maxsize=1024, ttl=5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class ResponseCache:
+    # Two tiers: the local LRU above, then an optional shared Redis-protocol
+    # client (anything with get/set(px=)/delete, e.g. redis.Redis or a stand-in)
+    # that every gunicorn worker reads and invalidates
+
+    def __init__(self, local=None, shared=None, shared_ttl=300, prefix='swapi:'):
+        self.local = local if local is not None else LRUCache()
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.prefix = prefix
+        self.counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'shared_errors': 0}
+
+    def count(self, name):
+        # gthread workers share this object; the local tier's lock guards the counters too
+        with self.local._lock:
+            self.counters[name] += 1
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self.count('local_hits')
+            return value
+
+        if self.shared is not None:
+            try:
+                value = self.shared.get(self.prefix + key)
+            except Exception:
+                self.count('shared_errors')
+                logger.warning('Shared cache unavailable on get(%s)', key, exc_info=True)
+            if value is not None:
+                self.count('shared_hits')
+                self.local.set(key, value)
+                return value
+
+        self.count('misses')
+        return None
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(self.prefix + key, value, px=int(self.shared_ttl * 1000))
+            except Exception:
+                self.count('shared_errors')
+                logger.warning('Shared cache unavailable on set(%s)', key, exc_info=True)
+
+    def delete(self, *keys):
+        self.local.delete(*keys)
+        if self.shared is not None:
+            try:
+                self.shared.delete(*[self.prefix + key for key in keys])
+            except Exception:
+                self.count('shared_errors')
+                logger.warning('Shared cache unavailable on delete(%s)', keys, exc_info=True)
+
+    def stats(self):
+        with self.local._lock:
+            counters = dict(self.counters)
+        lookups = counters['local_hits'] + counters['shared_hits'] + counters['misses']
+        hits = lookups - counters['misses']
+        return dict(
+            counters,
+            local_size=len(self.local),
+            local_maxsize=self.local.maxsize,
+            shared_enabled=self.shared is not None,
+            hit_ratio=round(hits / lookups, 4) if lookups else None
+        )
+
+response_cache = ResponseCache()
+
+def cached(key_template):
+    # Caches 200 responses of one entity, body and ETag together, under a key
+    # formatted with the view arguments, e.g. @cached('planet:{planet_id}').
+    # Goes above @versioned: a hit (and its 304) is answered from the entry
+    # alone, without a database round trip. The entity's PUT/DELETE handlers
+    # delete the key after their commit. Requests with a query string
+    # (?fields=...) bypass the cache so each entity has exactly one entry
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if request.args:
+                return view(**kwargs)
+
+            key = key_template.format(**kwargs)
+            entry = response_cache.get(key)
+            if entry is not None:
+                etag, _, body = entry.partition(b'|')
+                etag = etag.decode()
+                if request.if_none_match.contains_weak(etag):
+                    response = make_response('', 304)
+                else:
+                    response = make_response(body, 200, {'Content-Type': 'application/json'})
+                response.set_etag(etag)
+                return response
+
+            # The entry may be shared for minutes, so it is never filled from a lagging replica
+            read_from_primary()
+            response = make_response(view(**kwargs))
+            etag = response.get_etag()[0]
+            if response.status_code == 200 and etag:
+                versions = g.get('resource_versions')
+                response_cache.set(key, etag.encode() + b'|' + response.get_data())
+                # A write that committed while this body was read deletes the
+                # key before or after the set above; if before, its version
+                # bump shows here (in a new transaction) and the entry goes
+                db.session.rollback()
+                if versions is not None and current_versions(list(versions)) != versions:
+                    response_cache.delete(key)
+            return response
+        return wrapper
+    return decorator
+
+def setup_cache(app):
+    response_cache.local = LRUCache(
+        maxsize=int(os.environ.get('CACHE_LOCAL_MAXSIZE', 1024)),
+        ttl=float(os.environ.get('CACHE_LOCAL_TTL', 5))
+    )
+    response_cache.shared_ttl = float(os.environ.get('CACHE_SHARED_TTL', 300))
+
+    redis_url = os.environ.get('CACHE_REDIS_URL')
+    if redis_url:
+        if redis is None:
+            logger.warning('CACHE_REDIS_URL is set but the redis package is not installed; using the local tier only')
+        else:
+            response_cache.shared = redis.Redis.from_url(redis_url, socket_timeout=0.1)
+
+    @app.route('/cache/stats', methods=['GET'])
+    def cache_stats():
+        return jsonify({'msg': 'ok', 'data': response_cache.stats()}), 200
@@ -0,0 +1,43 @@
+from flask import Response, current_app, request, stream_with_context
+from models import db, Planets, Vehicles, Characters, FavoritePlanets, FavoriteVehicles, FavoriteCharacters
+from serializers import primary_key, public_columns, select_fields
+from utils import APIException
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_TABLES = {
+    'planets': Planets,
+    'vehicles': Vehicles,
+    'characters': Characters,
+    'favorite_planets': FavoritePlanets,
+    'favorite_vehicles': FavoriteVehicles,
+    'favorite_characters': FavoriteCharacters,
+}
+
+def export_rows(model, after=None):
+    pk = primary_key(model)
+    fields = list(public_columns(model))
+    stmt = select_fields(model, fields).order_by(pk)
+    if after is not None:
+        stmt = stmt.where(pk > after)
+
+    # stream_results gives a server-side cursor on Postgres, and yield_per
+    # bounds how many rows are buffered, so memory stays flat whatever the table size
+    result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE))
+    dumps = current_app.json.dumps_bytes
+    for partition in result.partitions():
+        yield b''.join(dumps(dict(zip(fields, row))) + b'\n' for row in partition)
+
+def export_response(table):
+    model = EXPORT_TABLES.get(table)
+    if model is None:
+        raise APIException(f'Unknown table: {table}. Available tables: {", ".join(EXPORT_TABLES)}', status_code=404)
+
+    after = request.args.get('after')
+    if after is not None:
+        try:
+            after = int(after)
+        except ValueError:
+            raise APIException('"after" must be an integer primary key', status_code=400)
+
+    return Response(stream_with_context(export_rows(model, after)), mimetype='application/x-ndjson')
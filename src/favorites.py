@@ -0,0 +1,386 @@
+import os
+from collections import Counter
+import click
+from flask import jsonify, request
+from sqlalchemy import and_, delete, exists, func, literal, select, update
+from models import db, User, Planets, Vehicles, Characters, FavoritePlanets, FavoriteVehicles, FavoriteCharacters
+from serializers import public_columns
+from utils import insert_ignore
+from versioning import bump_versions, favorites_key
+from write_behind import QueueFull, WriteBehindQueue
+
+MAX_BATCH_ITEMS = 1000
+DEFAULT_POPULAR_LIMIT = 10
+MAX_POPULAR_LIMIT = 100
+
+# kind -> (favorite model, entity model, label used in messages)
+FAVORITE_KINDS = {
+    'planet': (FavoritePlanets, Planets, 'Planet'),
+    'vehicle': (FavoriteVehicles, Vehicles, 'Vehicle'),
+    'character': (FavoriteCharacters, Characters, 'Character'),
+}
+
+# Keys accepted in a batch body, as in the GET /user/<id>/favorites payload
+BATCH_KINDS = {'planets': 'planet', 'vehicles': 'vehicle', 'characters': 'character'}
+
+def active_user_exists(user_id):
+    return exists(select(User.id).where(User.id == user_id, User.is_active == True))
+
+def favorite_status(kind, entity_id, user_id):
+    # One query for the 404/409 checks on the user and the entity, and for
+    # whether the favorite exists. Returns (failure or None, is_favorite)
+    favorite_model, model, label = FAVORITE_KINDS[kind]
+    entity_pk = getattr(model, f'{kind}_id')
+    user_is_active, entity_found, is_favorite = db.session.execute(select(
+        select(User.is_active).where(User.id == user_id).scalar_subquery(),
+        exists(select(entity_pk).where(entity_pk == entity_id)),
+        exists(select(favorite_model.id).where(favorite_model.user_id == user_id,
+                                               getattr(favorite_model, f'{kind}_id') == entity_id))
+    )).one()
+
+    if user_is_active is None:
+        return ({'msg': f'User with id: {user_id} doesn\'t exist'}, 404), is_favorite
+    if not user_is_active:
+        return ({'msg': f'User with id: {user_id} is deactivated'}, 409), is_favorite
+    if not entity_found:
+        return ({'msg': f'{label} with id: {entity_id} doesn\'t exist'}, 404), is_favorite
+    return None, is_favorite
+
+def diagnose(kind, entity_id, user_id):
+    # Only runs when the single-statement mutation touched no row: works out
+    # which of the original 404/409 checks failed
+    return favorite_status(kind, entity_id, user_id)[0]
+
+def already_favorite(label, entity_id, user_id):
+    return {'msg': f'{label} with id: {entity_id} is already a favorite for user with id: {user_id}'}, 409
+
+def not_favorite(kind, entity_id, user_id):
+    return {'msg': f'Favorite relationship between user id: {user_id} and {kind} id: {entity_id} doesn\'t exist'}, 404
+
+def added_message(label, entity_id, user_id):
+    return f'{label} with id: {entity_id} added as favorite for user with id: {user_id}'
+
+def removed_message(label, entity_id, user_id):
+    return f'{label} with id: {entity_id} deleted from favorites for user with id: {user_id}'
+
+def favorite_count_subquery(kind):
+    favorite_model, model, label = FAVORITE_KINDS[kind]
+    return (
+        select(func.count(favorite_model.id))
+        .where(getattr(favorite_model, f'{kind}_id') == getattr(model, f'{kind}_id'))
+        .scalar_subquery()
+    )
+
+def recount_favorites(kind, ids=None):
+    # Recomputes favorite_count from the favorites table, touching only the
+    # rows that drifted. Returns how many were corrected
+    favorite_model, model, label = FAVORITE_KINDS[kind]
+    counted = favorite_count_subquery(kind)
+    stmt = update(model).where(model.favorite_count != counted).values(favorite_count=counted)
+    if ids is not None:
+        stmt = stmt.where(getattr(model, f'{kind}_id').in_(ids))
+    return db.session.execute(stmt.execution_options(synchronize_session=False)).rowcount
+
+def adjust_favorite_counts(kind, ids, delta, affected):
+    # Runs in the transaction that inserted/deleted the favorites. When every
+    # row went through, the counters move by `delta` under the row lock; if a
+    # concurrent request got to some of them first, those ids are recounted
+    favorite_model, model, label = FAVORITE_KINDS[kind]
+    if affected == len(ids):
+        db.session.execute(
+            update(model)
+            .where(getattr(model, f'{kind}_id').in_(ids))
+            .values(favorite_count=model.favorite_count + delta)
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        recount_favorites(kind, ids)
+
+def add_favorite(kind, entity_id, user_id):
+    if favorite_queue.enabled:
+        return queue_favorite('add', kind, entity_id, user_id)
+    favorite_model, model, label = FAVORITE_KINDS[kind]
+    column = f'{kind}_id'
+    entity_pk = getattr(model, column)
+
+    # INSERT ... SELECT ... WHERE <user active> AND <entity exists> ON CONFLICT DO NOTHING:
+    # validation, the duplicate check and the insert in one statement
+    stmt = insert_ignore(favorite_model.__table__, db.session.get_bind(), ['user_id', column]).from_select(
+        ['user_id', column],
+        select(literal(user_id), literal(entity_id)).where(
+            active_user_exists(user_id),
+            exists(select(entity_pk).where(entity_pk == entity_id))
+        )
+    )
+    if db.session.execute(stmt).rowcount == 0:
+        db.session.rollback()
+        failure = diagnose(kind, entity_id, user_id)
+        if failure is not None:
+            return failure
+        return already_favorite(label, entity_id, user_id)
+
+    adjust_favorite_counts(kind, [entity_id], 1, 1)
+    bump_versions(favorites_key(user_id))
+    db.session.commit()
+    return {'msg': added_message(label, entity_id, user_id)}, 200
+
+def delete_favorite(kind, entity_id, user_id):
+    if favorite_queue.enabled:
+        return queue_favorite('remove', kind, entity_id, user_id)
+    favorite_model, model, label = FAVORITE_KINDS[kind]
+    column = f'{kind}_id'
+
+    stmt = delete(favorite_model).where(
+        favorite_model.user_id == user_id,
+        getattr(favorite_model, column) == entity_id,
+        active_user_exists(user_id)
+    ).execution_options(synchronize_session=False)
+    if db.session.execute(stmt).rowcount == 0:
+        db.session.rollback()
+        failure = diagnose(kind, entity_id, user_id)
+        if failure is not None:
+            return failure
+        return not_favorite(kind, entity_id, user_id)
+
+    adjust_favorite_counts(kind, [entity_id], -1, 1)
+    bump_versions(favorites_key(user_id))
+    db.session.commit()
+    return {'msg': removed_message(label, entity_id, user_id)}, 200
+
+def apply_favorite_changes(changes):
+    # Group commit for the write-behind queue. changes are (action, kind,
+    # entity id, user id) in arrival order; the last one per favorite wins.
+    # Per kind: one multi-row INSERT, one DELETE per user, one counter UPDATE
+    # per distinct delta, then a single version bump and commit
+    final = {}
+    for action, kind, entity_id, user_id in changes:
+        final[(kind, user_id, entity_id)] = action
+    try:
+        for kind, (favorite_model, model, label) in FAVORITE_KINDS.items():
+            column = f'{kind}_id'
+            adds = [(user_id, entity_id) for (k, user_id, entity_id), action in final.items() if k == kind and action == 'add']
+            removes = {}
+            for (k, user_id, entity_id), action in final.items():
+                if k == kind and action == 'remove':
+                    removes.setdefault(user_id, []).append(entity_id)
+
+            deltas, recount = Counter(), set()
+            if adds:
+                inserted = db.session.execute(
+                    insert_ignore(favorite_model.__table__, db.session.get_bind(), ['user_id', column])
+                    .values([{'user_id': user_id, column: entity_id} for user_id, entity_id in adds])
+                ).rowcount
+                if inserted == len(adds):
+                    deltas.update(entity_id for user_id, entity_id in adds)
+                else:
+                    recount.update(entity_id for user_id, entity_id in adds)
+            for user_id, ids in removes.items():
+                deleted = db.session.execute(
+                    delete(favorite_model)
+                    .where(favorite_model.user_id == user_id, getattr(favorite_model, column).in_(ids))
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                if deleted == len(ids):
+                    deltas.subtract(ids)
+                else:
+                    recount.update(ids)
+
+            by_delta = {}
+            for entity_id, delta in deltas.items():
+                if delta and entity_id not in recount:
+                    by_delta.setdefault(delta, []).append(entity_id)
+            for delta, ids in by_delta.items():
+                adjust_favorite_counts(kind, ids, delta, len(ids))
+            if recount:
+                recount_favorites(kind, list(recount))
+
+        if final:
+            bump_versions(*sorted({favorites_key(user_id) for kind, user_id, entity_id in final}))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+favorite_queue = WriteBehindQueue('favorites', apply_favorite_changes)
+
+def queue_favorite(action, kind, entity_id, user_id):
+    # Write-behind path of add_favorite/delete_favorite: validated here, written
+    # by the queue's next group commit
+    favorite_model, model, label = FAVORITE_KINDS[kind]
+    key = (kind, user_id, entity_id)
+    # Looked up before the database: a flush commits before it forgets its items
+    queued = favorite_queue.latest(key)
+    failure, is_favorite = favorite_status(kind, entity_id, user_id)
+    # Ends the read transaction instead of holding it while waiting for the flush
+    db.session.rollback()
+    if failure is not None:
+        return failure
+    if queued is not None:
+        is_favorite = queued.value[0] == 'add'
+    if action == 'add' and is_favorite:
+        return already_favorite(label, entity_id, user_id)
+    if action == 'remove' and not is_favorite:
+        return not_favorite(kind, entity_id, user_id)
+
+    try:
+        pending = favorite_queue.submit(key, (action, kind, entity_id, user_id))
+    except QueueFull:
+        return {'msg': 'Too many favorite changes are waiting to be written, try again shortly'}, 503
+    message = added_message(label, entity_id, user_id) if action == 'add' else removed_message(label, entity_id, user_id)
+    if favorite_queue.durability == 'queued' or not pending.wait(favorite_queue.commit_timeout):
+        return {'msg': f'{message} (queued)'}, 202
+    if pending.error is not None:
+        return {'msg': 'Error updating the favorites', 'error': str(pending.error)}, 500
+    return {'msg': message}, 200
+
+def read_batch(body):
+    # {"add": {"planets": [1, 2]}, "remove": {"vehicles": [3]}} -> {(action, kind): [ids]}
+    if not isinstance(body, dict) or not (set(body) & {'add', 'remove'}):
+        return None, 'You must send "add" and/or "remove" objects in the body'
+    batch = {}
+    for action in ('add', 'remove'):
+        groups = body.get(action, {})
+        if not isinstance(groups, dict) or set(groups) - set(BATCH_KINDS):
+            return None, f'"{action}" must be an object with any of the keys: {", ".join(BATCH_KINDS)}'
+        for key, ids in groups.items():
+            if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+                return None, f'"{action}.{key}" must be a list of integer ids'
+            batch[(action, BATCH_KINDS[key])] = list(dict.fromkeys(ids))
+    if sum(len(ids) for ids in batch.values()) > MAX_BATCH_ITEMS:
+        return None, f'A batch can carry at most {MAX_BATCH_ITEMS} items'
+    return batch, None
+
+def favorite_states(kind, user_id, ids):
+    # One query per kind: which ids exist and which are already favorites of the user
+    favorite_model, model, label = FAVORITE_KINDS[kind]
+    entity_pk = getattr(model, f'{kind}_id')
+    rows = db.session.execute(
+        select(entity_pk, favorite_model.id)
+        .outerjoin(favorite_model, and_(getattr(favorite_model, f'{kind}_id') == entity_pk,
+                                        favorite_model.user_id == user_id))
+        .where(entity_pk.in_(ids))
+    ).all()
+    return {entity_id: favorite_id is not None for entity_id, favorite_id in rows}
+
+def apply_favorite_batch(user_id, body):
+    batch, error = read_batch(body)
+    if error:
+        return {'msg': error}, 400
+
+    user_is_active = db.session.execute(select(User.is_active).where(User.id == user_id)).scalar()
+    if user_is_active is None:
+        return {'msg': f'User with id: {user_id} doesn\'t exist'}, 404
+    if not user_is_active:
+        return {'msg': f'User with id: {user_id} is deactivated'}, 409
+
+    results = []
+    to_add = {kind: [] for kind in FAVORITE_KINDS}
+    to_remove = {kind: [] for kind in FAVORITE_KINDS}
+    for kind, (favorite_model, model, label) in FAVORITE_KINDS.items():
+        add_ids = batch.get(('add', kind), [])
+        remove_ids = batch.get(('remove', kind), [])
+        if not add_ids and not remove_ids:
+            continue
+        states = favorite_states(kind, user_id, add_ids + remove_ids)
+        conflicting = set(add_ids) & set(remove_ids)
+
+        for action, ids in (('add', add_ids), ('remove', remove_ids)):
+            for entity_id in ids:
+                item = {'action': action, 'kind': kind, 'id': entity_id}
+                if entity_id in conflicting:
+                    item.update(status=400, msg=f'{label} with id: {entity_id} is both added and removed in this batch')
+                elif entity_id not in states:
+                    item.update(status=404, msg=f'{label} with id: {entity_id} doesn\'t exist')
+                elif action == 'add' and states[entity_id]:
+                    item.update(status=409, msg=already_favorite(label, entity_id, user_id)[0]['msg'])
+                elif action == 'remove' and not states[entity_id]:
+                    item.update(status=404, msg=not_favorite(kind, entity_id, user_id)[0]['msg'])
+                else:
+                    item.update(status=200, msg='added' if action == 'add' else 'removed')
+                    (to_add if action == 'add' else to_remove)[kind].append(entity_id)
+                results.append(item)
+
+    applied = sum(len(ids) for ids in to_add.values()) + sum(len(ids) for ids in to_remove.values())
+    if applied:
+        try:
+            for kind, (favorite_model, model, label) in FAVORITE_KINDS.items():
+                column = f'{kind}_id'
+                # Single multi-row statements, so rowcount is the number of rows actually changed
+                if to_add[kind]:
+                    inserted = db.session.execute(
+                        insert_ignore(favorite_model.__table__, db.session.get_bind(), ['user_id', column])
+                        .values([{'user_id': user_id, column: entity_id} for entity_id in to_add[kind]])
+                    ).rowcount
+                    adjust_favorite_counts(kind, to_add[kind], 1, inserted)
+                if to_remove[kind]:
+                    deleted = db.session.execute(
+                        delete(favorite_model)
+                        .where(favorite_model.user_id == user_id, getattr(favorite_model, column).in_(to_remove[kind]))
+                        .execution_options(synchronize_session=False)
+                    ).rowcount
+                    adjust_favorite_counts(kind, to_remove[kind], -1, deleted)
+            bump_versions(favorites_key(user_id))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return {'msg': 'Error updating the favorites', 'error': str(e)}, 500
+
+    status = 200 if applied == len(results) else 207
+    return {'msg': f'{applied} of {len(results)} favorite changes applied for user with id: {user_id}', 'data': results}, status
+
+def popular(plural_kind):
+    # Top-N read straight off the (favorite_count, pk) index, scanned backwards
+    if plural_kind not in BATCH_KINDS:
+        return {'msg': f'Unknown kind: {plural_kind}. Available kinds: {", ".join(BATCH_KINDS)}'}, 404
+    try:
+        limit = int(request.args.get('limit', DEFAULT_POPULAR_LIMIT))
+    except ValueError:
+        return {'msg': '"limit" must be an integer'}, 400
+    if limit < 1 or limit > MAX_POPULAR_LIMIT:
+        return {'msg': f'"limit" must be between 1 and {MAX_POPULAR_LIMIT}'}, 400
+
+    kind = BATCH_KINDS[plural_kind]
+    favorite_model, model, label = FAVORITE_KINDS[kind]
+    fields = list(public_columns(model)) + ['favorite_count']
+    rows = db.session.execute(
+        select(*[getattr(model, field) for field in fields])
+        .where(model.favorite_count > 0)
+        .order_by(model.favorite_count.desc(), getattr(model, f'{kind}_id').desc())
+        .limit(limit)
+    ).all()
+    return {'msg': 'ok', 'data': [dict(zip(fields, row)) for row in rows]}, 200
+
+def setup_favorite_commands(app):
+    @app.cli.group('favorites')
+    def favorites_cli():
+        """Maintenance of the favorite counters."""
+
+    @favorites_cli.command('reconcile')
+    @click.option('--kind', type=click.Choice(list(FAVORITE_KINDS)), help='Only this kind (default: all)')
+    def reconcile(kind):
+        """Backfill or repair favorite_count from the favorite tables."""
+        for name in [kind] if kind else FAVORITE_KINDS:
+            corrected = recount_favorites(name)
+            db.session.commit()
+            click.echo(f'{name}: {corrected} counters corrected')
+
+def setup_favorite_queue(app):
+    # Off unless FAVORITES_WRITE_BEHIND is set. Single favorite adds and
+    # deletes are then validated in the request and written by a background
+    # thread in group commits of up to FAVORITES_BATCH_SIZE changes, gathered
+    # for FAVORITES_FLUSH_MS. FAVORITES_DURABILITY=commit (default) answers
+    # once the change is committed; queued answers 202 as soon as it is queued
+    if os.environ.get('FAVORITES_WRITE_BEHIND', 'false').lower() not in ('1', 'true', 'yes'):
+        return
+    favorite_queue.configure(
+        app,
+        max_size=int(os.environ.get('FAVORITES_QUEUE_SIZE', 10000)),
+        batch_size=int(os.environ.get('FAVORITES_BATCH_SIZE', 500)),
+        flush_seconds=float(os.environ.get('FAVORITES_FLUSH_MS', 5)) / 1000,
+        durability=os.environ.get('FAVORITES_DURABILITY', 'commit'),
+        commit_timeout=float(os.environ.get('FAVORITES_COMMIT_TIMEOUT', 5)),
+    )
+
+    @app.route('/favorites/queue/stats', methods=['GET'])
+    def get_favorite_queue_stats():
+        return jsonify({'msg': 'ok', 'data': favorite_queue.stats()}), 200
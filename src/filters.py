@@ -0,0 +1,91 @@
+from functools import lru_cache
+from flask import request
+from sqlalchemy import Integer
+from serializers import primary_key, public_columns
+from utils import APIException
+
+MAX_IN_VALUES = 100
+
+# Query-string keys owned by pagination and field selection, never filters
+RESERVED_ARGS = ('fields', 'limit', 'after', 'count', 'sort', 'ids')
+
+FILTER_OPERATORS = {
+    'eq': lambda column, value: column == value,
+    'gt': lambda column, value: column > value,
+    'gte': lambda column, value: column >= value,
+    'lt': lambda column, value: column < value,
+    'lte': lambda column, value: column <= value,
+    'in': lambda column, values: column.in_(values),
+}
+
+@lru_cache(maxsize=None)
+def filter_columns(model):
+    # Only columns flagged with info={'filter': True} (each backed by a
+    # (column, primary key) index) can be filtered and sorted on
+    return {key: column for key, column in public_columns(model).items() if column.info.get('filter')}
+
+def parse_value(column, field, raw):
+    if isinstance(column.type, Integer):
+        try:
+            return int(raw)
+        except ValueError:
+            raise APIException(f'"{field}" must be an integer', status_code=400)
+    return raw
+
+def read_ids(model):
+    # ?ids=1,2,3 -> [pk IN (1, 2, 3)]: fetches several entities with one
+    # query instead of one request each
+    raw = request.args.get('ids')
+    if raw is None:
+        return []
+    pk = primary_key(model)
+    ids = [parse_value(pk, 'ids', value) for value in raw.split(',') if value != '']
+    if not ids or len(ids) > MAX_IN_VALUES:
+        raise APIException(f'"ids" takes between 1 and {MAX_IN_VALUES} comma-separated values', status_code=400)
+    return [pk.in_(ids)]
+
+def read_filters(model):
+    # Turns ?population__gt=1000&terrain=desert&gender__in=male,female into
+    # WHERE conditions. Repeated keys are ANDed together; query keys that aren't
+    # columns of the model are left alone
+    columns = filter_columns(model)
+    public = public_columns(model)
+    conditions = read_ids(model)
+    for arg, raw_values in request.args.lists():
+        if arg in RESERVED_ARGS:
+            continue
+        field, _, operator = arg.partition('__')
+        if field not in public:
+            continue
+        if field not in columns:
+            raise APIException(f'Can\'t filter on {field}. Filterable fields: {", ".join(columns)}', status_code=400)
+        operator = operator or 'eq'
+        if operator not in FILTER_OPERATORS:
+            raise APIException(f'Unknown operator {operator}. Available operators: {", ".join(FILTER_OPERATORS)}', status_code=400)
+
+        column = columns[field]
+        for raw in raw_values:
+            if operator == 'in':
+                values = [parse_value(column, field, value) for value in raw.split(',') if value != '']
+                if not values or len(values) > MAX_IN_VALUES:
+                    raise APIException(f'"{arg}" takes between 1 and {MAX_IN_VALUES} comma-separated values', status_code=400)
+                conditions.append(FILTER_OPERATORS['in'](column, values))
+            else:
+                conditions.append(FILTER_OPERATORS[operator](column, parse_value(column, field, raw)))
+    return conditions
+
+def read_sort(model):
+    # ?sort=population or ?sort=-population (descending). Returns
+    # (column, descending), or None for the default primary key order
+    sort = request.args.get('sort')
+    if not sort:
+        return None
+    descending = sort.startswith('-')
+    field = sort[1:] if descending else sort
+    pk = primary_key(model)
+    if field == pk.key:
+        return pk, descending
+    columns = filter_columns(model)
+    if field not in columns:
+        raise APIException(f'Can\'t sort on {field}. Sortable fields: {", ".join([pk.key] + list(columns))}', status_code=400)
+    return columns[field], descending
@@ -0,0 +1,98 @@
+import logging
+import os
+import re
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Expanding IN lists render one placeholder per value; collapse them so
+# "IN (?, ?)" and "IN (?, ?, ?)" count as the same statement shape
+PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+def statement_shape(statement):
+    return PLACEHOLDER_LIST.sub('(?)', WHITESPACE.sub(' ', statement).strip())
+
+def new_stats():
+    return {'count': 0, 'seconds': 0.0, 'slowest_seconds': 0.0, 'slowest': None, 'shapes': Counter()}
+
+# Registered on the Engine class so the sync engine, the ASGI async engine and
+# any engine created later are all covered. Statements run outside a request
+# (CLI commands, migrations) are ignored
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.sql_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.sql_started
+    if not has_request_context():
+        return
+    stats = g.get('sql_stats')
+    if stats is None:
+        return
+    stats['count'] += 1
+    stats['seconds'] += elapsed
+    stats['shapes'][statement_shape(statement)] += 1
+    if elapsed >= stats['slowest_seconds']:
+        stats['slowest_seconds'] = elapsed
+        stats['slowest'] = statement
+
+def server_timing(stats, total_seconds):
+    description = f'{stats["count"]} queries'
+    return ', '.join([
+        f'db;dur={stats["seconds"] * 1000:.2f};desc="{description}"',
+        f'db-slowest;dur={stats["slowest_seconds"] * 1000:.2f}',
+        f'total;dur={total_seconds * 1000:.2f}',
+    ])
+
+def debug_payload(stats, threshold):
+    return {
+        'queries': stats['count'],
+        'db_ms': round(stats['seconds'] * 1000, 3),
+        'slowest': {'ms': round(stats['slowest_seconds'] * 1000, 3), 'statement': stats['slowest']},
+        'repeated': [{'statement': shape, 'count': count}
+                     for shape, count in stats['shapes'].most_common() if count > 1],
+        'n_plus_one_threshold': threshold,
+    }
+
+def setup_instrumentation(app):
+    # SQL_N_PLUS_ONE_THRESHOLD: warn when one statement shape runs more than
+    # this many times in a request (0 disables). SQL_DEBUG_PAYLOAD: allow
+    # clients to ask for the figures in the body with `X-Debug-SQL: 1`
+    app.config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD', 10)))
+    app.config.setdefault('SQL_DEBUG_PAYLOAD', os.environ.get('SQL_DEBUG_PAYLOAD', '').lower() in ('1', 'true', 'yes'))
+
+    @app.before_request
+    def start_sql_stats():
+        g.sql_stats = new_stats()
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def report_sql_stats(response):
+        stats = g.get('sql_stats')
+        if stats is None:
+            return response
+        threshold = app.config['SQL_N_PLUS_ONE_THRESHOLD']
+
+        if threshold:
+            for shape, count in stats['shapes'].items():
+                if count > threshold:
+                    logger.warning('Possible N+1 in %s %s (%s): %d executions of %s',
+                                   request.method, request.path, request.endpoint, count, shape)
+
+        response.headers['Server-Timing'] = server_timing(stats, time.perf_counter() - g.request_started)
+
+        # Streamed responses (/export) can't be rewritten, and only JSON objects have room for the extra key
+        if (app.config['SQL_DEBUG_PAYLOAD'] and request.headers.get('X-Debug-SQL') == '1'
+                and not response.is_streamed and response.is_json):
+            body = response.get_json(silent=True)
+            if isinstance(body, dict):
+                body['_debug_sql'] = debug_payload(stats, threshold)
+                response.set_data(app.json.dumps(body))
+        return response
@@ -0,0 +1,50 @@
+import json
+import os
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    # Flask's default provider plus dumps_bytes(), the compact encoder the
+    # list endpoints use to write their rows straight into the response body
+
+    def dumps_bytes(self, obj):
+        return json.dumps(obj, default=self.default, sort_keys=self.sort_keys,
+                          ensure_ascii=self.ensure_ascii, separators=(',', ':')).encode()
+
+class OrjsonProvider(StdlibJSONProvider):
+    # Same output contract as the default provider (sorted keys, compact unless
+    # debugging) but encoded by orjson, which writes bytes directly
+
+    def _options(self, indent=None):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps_bytes(self, obj):
+        return orjson.dumps(obj, default=self.default, option=self._options())
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options(kwargs.get('indent'))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+def setup_json(app):
+    # JSON_PROVIDER=stdlib forces the standard library encoder even when orjson is installed
+    if orjson is not None and os.environ.get('JSON_PROVIDER', 'orjson') != 'stdlib':
+        app.json = OrjsonProvider(app)
+    else:
+        app.json = StdlibJSONProvider(app)
@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+import time
+from flask import Response, g, request
+from cache import response_cache
+from models import db
+from pool import pool_stats
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+# Pool and cache figures change on every request; copying them into the
+# metrics at most once per interval keeps the per-request cost flat
+GAUGE_REFRESH_SECONDS = 1.0
+
+CACHE_COUNTERS = ('local_hits', 'shared_hits', 'misses', 'shared_errors')
+POOL_GAUGES = ('size', 'checked_in', 'checked_out', 'overflow')
+POOL_COUNTERS = ('checkouts', 'timeouts', 'wait_seconds_total', 'connects', 'invalidations')
+
+class Metrics:
+    # Created only when prometheus_client is available. With
+    # PROMETHEUS_MULTIPROC_DIR set (see gunicorn.conf.py) every worker writes
+    # to files in that directory and a scrape of any worker aggregates them all
+
+    def __init__(self):
+        self.multiprocess = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+        self.requests = prometheus_client.Counter(
+            'swapi_http_requests_total', 'HTTP requests by endpoint, method and status',
+            ['endpoint', 'method', 'status'])
+        self.latency = prometheus_client.Histogram(
+            'swapi_http_request_duration_seconds', 'Time spent handling a request',
+            ['endpoint', 'method'], buckets=LATENCY_BUCKETS)
+        self.cache = prometheus_client.Counter(
+            'swapi_response_cache_events_total', 'Response cache lookups and errors', ['event'])
+        self.pool_gauges = prometheus_client.Gauge(
+            'swapi_db_pool_connections', 'Database pool connections by state', ['state'],
+            multiprocess_mode='livesum')
+        self.pool_counters = prometheus_client.Counter(
+            'swapi_db_pool_events_total', 'Database pool checkouts, timeouts, wait seconds and connection events',
+            ['event'])
+        self.last_refresh = 0.0
+        self.last_seen = {}
+        self._refresh_lock = threading.Lock()
+
+    def observe(self, endpoint, method, status, seconds):
+        self.requests.labels(endpoint, method, status).inc()
+        self.latency.labels(endpoint, method).observe(seconds)
+
+    def add_delta(self, counter, name, value):
+        # The sources keep running totals; counters only take increments
+        previous = self.last_seen.get((counter, name), 0)
+        if value > previous:
+            counter.labels(name).inc(value - previous)
+        self.last_seen[(counter, name)] = value
+
+    def refresh(self, engine, force=False):
+        if not force and time.monotonic() - self.last_refresh < GAUGE_REFRESH_SECONDS:
+            return
+        # Request threads skip the refresh if another thread is already doing it
+        if not self._refresh_lock.acquire(blocking=force):
+            return
+        try:
+            self.last_refresh = time.monotonic()
+            for name in CACHE_COUNTERS:
+                self.add_delta(self.cache, name, response_cache.counters[name])
+            stats = pool_stats(engine)
+            for name in POOL_GAUGES:
+                if name in stats:
+                    self.pool_gauges.labels(name).set(stats[name])
+            for name in POOL_COUNTERS:
+                if name in stats:
+                    self.add_delta(self.pool_counters, name, stats[name])
+        finally:
+            self._refresh_lock.release()
+
+    def exposition(self):
+        if self.multiprocess:
+            registry = prometheus_client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = prometheus_client.REGISTRY
+        return prometheus_client.generate_latest(registry)
+
+def setup_metrics(app):
+    if prometheus_client is None:
+        logger.warning('prometheus_client is not installed; /metrics is disabled')
+        return
+    metrics = Metrics()
+
+    @app.before_request
+    def start_metrics_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_metrics(response):
+        started = g.get('metrics_started')
+        if started is not None:
+            # Unmatched URLs share one label so scanners can't blow up the series count
+            metrics.observe(request.endpoint or 'unmatched', request.method, str(response.status_code),
+                            time.perf_counter() - started)
+            metrics.refresh(db.session.get_bind())
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        metrics.refresh(db.session.get_bind(), force=True)
+        return Response(metrics.exposition(), content_type=prometheus_client.CONTENT_TYPE_LATEST)
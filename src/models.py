@@ -1,16 +1,17 @@
 from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
+from replicas import RoutingSession
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'user'
     id = db.Column(db.Integer, primary_key=True)
     user_name =  db.Column(db.String(35), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(80), unique=False, nullable=False)
+    password = db.Column(db.String(80), unique=False, nullable=False, info={'serialize': False})
     is_active = db.Column(db.Boolean(), unique=False, nullable=False)
 
     def __repr__(self):
-        return f'User: {self.username}'
+        return f'User: {self.user_name}'
 
     def serialize(self):
         return {
@@ -22,12 +23,21 @@ class User(db.Model):
 
 class Planets(db.Model):
     __tablename__ = 'planets'
+    __table_args__ = (
+        db.Index('ix_planets_name_planet_id', 'name', 'planet_id'),
+        db.Index('ix_planets_diameter_planet_id', 'diameter', 'planet_id'),
+        db.Index('ix_planets_population_planet_id', 'population', 'planet_id'),
+        db.Index('ix_planets_terrain_planet_id', 'terrain', 'planet_id'),
+        db.Index('ix_planets_favorite_count_planet_id', 'favorite_count', 'planet_id'),
+    )
     planet_id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50), unique=True, nullable=False)
-    diameter = db.Column(db.Integer, nullable=True)
-    population = db.Column(db.Integer, nullable=True)
+    name = db.Column(db.String(50), unique=True, nullable=False, info={'filter': True})
+    diameter = db.Column(db.Integer, nullable=True, info={'filter': True})
+    population = db.Column(db.Integer, nullable=True, info={'filter': True})
     duration_day = db.Column(db.Integer, nullable=True)
-    terrain = db.Column(db.String(50), nullable=True)
+    terrain = db.Column(db.String(50), nullable=True, info={'filter': True})
+    # Maintained by favorites.py; `flask favorites reconcile` recomputes it
+    favorite_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', info={'serialize': False})
 
     def __repr__(self):
         return f'Planet: {self.name}'
@@ -44,12 +54,21 @@ class Planets(db.Model):
     
 class Vehicles(db.Model):
     __tablename__ = 'vehicles'
+    __table_args__ = (
+        db.Index('ix_vehicles_name_vehicle_id', 'name', 'vehicle_id'),
+        db.Index('ix_vehicles_crew_vehicle_id', 'crew', 'vehicle_id'),
+        db.Index('ix_vehicles_model_vehicle_id', 'model', 'vehicle_id'),
+        db.Index('ix_vehicles_cargo_capacity_vehicle_id', 'cargo_capacity', 'vehicle_id'),
+        db.Index('ix_vehicles_favorite_count_vehicle_id', 'favorite_count', 'vehicle_id'),
+    )
     vehicle_id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50), unique=True, nullable=False)
-    crew = db.Column(db.Integer, nullable=True)
-    model = db.Column(db.String(50), nullable=True)
+    name = db.Column(db.String(50), unique=True, nullable=False, info={'filter': True})
+    crew = db.Column(db.Integer, nullable=True, info={'filter': True})
+    model = db.Column(db.String(50), nullable=True, info={'filter': True})
     lenght = db.Column(db.Integer,  nullable=True)
-    cargo_capacity = db.Column(db.Integer,  nullable=True)
+    cargo_capacity = db.Column(db.Integer,  nullable=True, info={'filter': True})
+    # Maintained by favorites.py; `flask favorites reconcile` recomputes it
+    favorite_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', info={'serialize': False})
 
     def __repr__(self):
         return f'Vehicle: {self.name}'
@@ -66,12 +85,21 @@ class Vehicles(db.Model):
       
 class Characters(db.Model):
     __tablename__ = 'characters'
+    __table_args__ = (
+        db.Index('ix_characters_name_character_id', 'name', 'character_id'),
+        db.Index('ix_characters_gender_character_id', 'gender', 'character_id'),
+        db.Index('ix_characters_skin_color_character_id', 'skin_color', 'character_id'),
+        db.Index('ix_characters_height_character_id', 'height', 'character_id'),
+        db.Index('ix_characters_favorite_count_character_id', 'favorite_count', 'character_id'),
+    )
     character_id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30), nullable=False)
-    skin_color = db.Column(db.String(30), nullable=True) 
+    name = db.Column(db.String(30), nullable=False, info={'filter': True})
+    skin_color = db.Column(db.String(30), nullable=True, info={'filter': True})
     birth_year = db.Column(db.String(50), nullable=True)
-    gender = db.Column(db.String(20), nullable=True)
-    height = db.Column(db.Integer, nullable=True)
+    gender = db.Column(db.String(20), nullable=True, info={'filter': True})
+    height = db.Column(db.Integer, nullable=True, info={'filter': True})
+    # Maintained by favorites.py; `flask favorites reconcile` recomputes it
+    favorite_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', info={'serialize': False})
 
     def __repr__(self):
         return f'Character: {self.name}'
@@ -88,10 +116,14 @@ class Characters(db.Model):
 
 class FavoritePlanets(db.Model):
     __tablename__ = 'favorite_planets'
+    __table_args__ = (
+        db.Index('ix_favorite_planets_user_id_planet_id', 'user_id', 'planet_id', unique=True),
+        db.Index('ix_favorite_planets_planet_id', 'planet_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  
     user_relationship = db.relationship('User', backref='favorite_planets')
-    planet_id = db.Column(db.Integer, db.ForeignKey('planets.id'), nullable=False)  
+    planet_id = db.Column(db.Integer, db.ForeignKey('planets.planet_id'), nullable=False)  
 
     planet_relationship = db.relationship('Planets', backref='favorite_planets')
 
@@ -107,10 +139,14 @@ class FavoritePlanets(db.Model):
     
 class FavoriteCharacters(db.Model):
     __tablename__ = 'favorite_characters'
+    __table_args__ = (
+        db.Index('ix_favorite_characters_user_id_character_id', 'user_id', 'character_id', unique=True),
+        db.Index('ix_favorite_characters_character_id', 'character_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  
     user_relationship = db.relationship('User', backref='favorite_characters')
-    character_id = db.Column(db.Integer, db.ForeignKey('characters.id'), nullable=False) 
+    character_id = db.Column(db.Integer, db.ForeignKey('characters.character_id'), nullable=False) 
 
     character_relationship = db.relationship('Characters', backref='favorite_characters')
 
@@ -127,10 +163,14 @@ class FavoriteCharacters(db.Model):
 class FavoriteVehicles(db.Model):
 
     __tablename__ = 'favorite_vehicles'
+    __table_args__ = (
+        db.Index('ix_favorite_vehicles_user_id_vehicle_id', 'user_id', 'vehicle_id', unique=True),
+        db.Index('ix_favorite_vehicles_vehicle_id', 'vehicle_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  
     user_relationship = db.relationship('User', backref='favorite_vehicles')
-    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id'), nullable=False)  
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.vehicle_id'), nullable=False)  
     
     vehicle_relationship = db.relationship('Vehicles', backref='favorite_vehicles')
 
@@ -142,4 +182,39 @@ class FavoriteVehicles(db.Model):
             "id": self.id,
             "user_id": self.user_id,
             "vehicle_id": self.vehicle_id
-        }
\ No newline at end of file
+        }
+
+class ResourceVersion(db.Model):
+    # One counter per table ('planets', 'user', ...) or per user's favorites
+    # ('favorites:<user_id>'), bumped on every write and used to build ETags
+    __tablename__ = 'resource_versions'
+    key = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'(Version of {self.key}: {self.version})'
+
+    def serialize(self):
+        return {
+            "key": self.key,
+            "version": self.version
+        }
+
+class NameChange(db.Model):
+    # Log of the planets/vehicles/characters rows whose name was created,
+    # changed or deleted; each worker's search index re-reads just those rows
+    # (search.py). Only the newest entries are kept
+    __tablename__ = 'name_changes'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'(Name change {self.id}: {self.kind} {self.entity_id})'
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "entity_id": self.entity_id
+        }
@@ -0,0 +1,137 @@
+import base64
+import json
+from flask import request, url_for
+from sqlalchemy import func, select, text, tuple_
+from models import db
+from utils import APIException, INTEGER_MIN, INTEGER_MAX
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise APIException('Invalid "after" cursor', status_code=400)
+    if not isinstance(values, list) or not values:
+        raise APIException('Invalid "after" cursor', status_code=400)
+    return values
+
+def cursor_value_ok(column, value):
+    if value is None:
+        return column.nullable
+    if column.type.python_type is int:
+        return isinstance(value, int) and not isinstance(value, bool) and INTEGER_MIN <= value <= INTEGER_MAX
+    return isinstance(value, column.type.python_type)
+
+def check_cursor(after, *columns):
+    # The cursor comes back from the client: one value per column it seeks
+    # on, each of that column's type, before any of it reaches a bind
+    if len(after) != len(columns) or not all(cursor_value_ok(column, value) for column, value in zip(columns, after)):
+        raise APIException('Invalid "after" cursor', status_code=400)
+
+def read_page_args():
+    limit = request.args.get('limit', DEFAULT_LIMIT)
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise APIException('"limit" must be an integer', status_code=400)
+    if limit < 1 or limit > MAX_LIMIT:
+        raise APIException(f'"limit" must be between 1 and {MAX_LIMIT}', status_code=400)
+
+    after = request.args.get('after')
+    if after is not None:
+        after = decode_cursor(after)
+    return limit, after
+
+def wants_total():
+    return request.args.get('count', '').lower() in ('1', 'true', 'yes')
+
+def keyset_page(stmt, pk_column, sort=None):
+    # Seek past the last key the client saw instead of using OFFSET,
+    # so page N costs the same index range scan as page 1. `sort` is
+    # (column, descending) from filters.read_sort
+    limit, after = read_page_args()
+    if sort is not None and sort[0] is not pk_column:
+        return sorted_keyset_page(stmt, pk_column, sort[0], sort[1], limit, after)
+
+    descending = sort is not None and sort[1]
+    if after is not None:
+        check_cursor(after, pk_column)
+        stmt = stmt.where(pk_column < after[0] if descending else pk_column > after[0])
+    rows = db.session.execute(stmt.order_by(pk_column.desc() if descending else pk_column).limit(limit + 1)).all()
+
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_url = next_page_url([getattr(rows[-1], pk_column.key)], limit)
+    return rows, next_url
+
+def sorted_keyset_page(stmt, pk_column, sort_column, descending, limit, after):
+    # Rows with a value come first, ordered by (sort_column, pk) in the same
+    # direction so one forward or backward scan of the (column, pk) index
+    # serves the page. NULLs always follow, in primary key order, through
+    # the same index. The cursor is [value, pk], or [null, pk] inside the NULL tail
+    if after is not None:
+        check_cursor(after, sort_column, pk_column)
+    if sort_column.key not in stmt.selected_columns:
+        # Needed for the cursor; rows_response only encodes the requested fields
+        stmt = stmt.add_columns(sort_column)
+
+    rows = []
+    if after is None or after[0] is not None:
+        with_value = stmt.where(sort_column.isnot(None))
+        if after is not None:
+            position, cursor = tuple_(sort_column, pk_column), tuple_(after[0], after[1])
+            with_value = with_value.where(position < cursor if descending else position > cursor)
+        order = (sort_column.desc(), pk_column.desc()) if descending else (sort_column, pk_column)
+        rows = db.session.execute(with_value.order_by(*order).limit(limit + 1)).all()
+
+    if len(rows) <= limit:
+        nulls = stmt.where(sort_column.is_(None))
+        if after is not None and after[0] is None:
+            nulls = nulls.where(pk_column > after[1])
+        rows += db.session.execute(nulls.order_by(pk_column).limit(limit + 1 - len(rows))).all()
+
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_url = next_page_url([getattr(rows[-1], sort_column.key), getattr(rows[-1], pk_column.key)], limit)
+    return rows, next_url
+
+def next_page_url(cursor_values, limit):
+    args = request.args.to_dict()
+    args.update(request.view_args or {})
+    args['after'] = encode_cursor(cursor_values)
+    args['limit'] = limit
+    return url_for(request.endpoint, **args)
+
+def table_total(model, conditions=()):
+    # Returns (total, is_estimate). Postgres keeps a planner estimate in
+    # pg_class that costs nothing to read; filtered lists and other databases
+    # get an exact count
+    table_name = model.__tablename__
+    if not conditions and db.session.get_bind().dialect.name == 'postgresql':
+        estimate = db.session.execute(
+            text('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)'),
+            {'table_name': f'"{table_name}"'}
+        ).scalar()
+        # reltuples is -1 (or 0 on older versions) until the table is first analyzed
+        if estimate is not None and estimate > 0:
+            return estimate, True
+    total = db.session.execute(select(func.count()).select_from(model.__table__).where(*conditions)).scalar()
+    return total, False
+
+def page_body(msg, next_url, model, conditions=()):
+    body = {
+        "msg": msg,
+        "next": next_url
+    }
+    if wants_total():
+        body['total'], body['total_is_estimate'] = table_total(model, conditions)
+    return body
@@ -0,0 +1,143 @@
+import logging
+import os
+import threading
+import time
+from flask import jsonify
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# DB_POOL_PRESET picks a base; any DB_* variable below overrides a single value
+POOL_PRESETS = {
+    'default': {},
+    'production': {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 10,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+        'pool_use_lifo': True,
+        'statement_timeout_ms': 30000,
+    },
+    # PgBouncer in transaction pooling mode owns the server connections, so the
+    # client pool stays small and nothing session-scoped (SET, prepared
+    # statements) is relied on; set statement_timeout on the role instead
+    'pgbouncer': {
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 10,
+        'pool_recycle': 300,
+        'pool_pre_ping': True,
+    },
+}
+
+ENV_OPTIONS = {
+    'DB_POOL_SIZE': ('pool_size', int),
+    'DB_MAX_OVERFLOW': ('max_overflow', int),
+    'DB_POOL_TIMEOUT': ('pool_timeout', float),
+    'DB_POOL_RECYCLE': ('pool_recycle', int),
+    'DB_POOL_PRE_PING': ('pool_pre_ping', lambda value: value.lower() in ('1', 'true', 'yes')),
+    'DB_POOL_USE_LIFO': ('pool_use_lifo', lambda value: value.lower() in ('1', 'true', 'yes')),
+    'DB_STATEMENT_TIMEOUT_MS': ('statement_timeout_ms', int),
+}
+
+class WaitStatsMixin:
+    # Records how long pool checkouts wait and how often they time out
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = {'checkouts': 0, 'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0, 'timeouts': 0}
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.wait_stats['timeouts'] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.wait_stats['checkouts'] += 1
+                self.wait_stats['wait_seconds_total'] += waited
+                self.wait_stats['wait_seconds_max'] = max(self.wait_stats['wait_seconds_max'], waited)
+
+class InstrumentedQueuePool(WaitStatsMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(WaitStatsMixin, AsyncAdaptedQueuePool):
+    pass
+
+def engine_options(database_uri, asynchronous=False):
+    preset = os.environ.get('DB_POOL_PRESET', 'default')
+    if preset not in POOL_PRESETS:
+        raise ValueError(f'Unknown DB_POOL_PRESET {preset!r}, expected one of: {", ".join(POOL_PRESETS)}')
+    settings = dict(POOL_PRESETS[preset])
+    for variable, (option, parse) in ENV_OPTIONS.items():
+        if os.environ.get(variable):
+            settings[option] = parse(os.environ[variable])
+
+    url = make_url(database_uri)
+    statement_timeout_ms = settings.pop('statement_timeout_ms', None)
+    if url.get_backend_name() == 'sqlite':
+        # SQLite uses its own pool classes, which take none of the sizing options
+        return {key: value for key, value in settings.items() if key == 'pool_pre_ping'}
+
+    options = dict(settings, poolclass=InstrumentedAsyncQueuePool if asynchronous else InstrumentedQueuePool)
+    if url.get_backend_name() == 'postgresql':
+        connect_args = {}
+        if preset == 'pgbouncer':
+            if statement_timeout_ms:
+                logger.warning('DB_STATEMENT_TIMEOUT_MS is ignored with the pgbouncer preset; set it on the database role')
+            if asynchronous:
+                # asyncpg prepares statements per connection, which transaction pooling breaks
+                connect_args = {'statement_cache_size': 0, 'prepared_statement_cache_size': 0}
+        elif statement_timeout_ms:
+            if asynchronous:
+                connect_args = {'server_settings': {'statement_timeout': str(statement_timeout_ms)}}
+            else:
+                connect_args = {'options': f'-c statement_timeout={statement_timeout_ms}'}
+        if connect_args:
+            options['connect_args'] = connect_args
+    return options
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    if isinstance(pool, WaitStatsMixin):
+        stats.update(pool.wait_stats)
+    stats.update(getattr(engine, 'connection_events', {}))
+    return stats
+
+def track_connection_events(engine):
+    engine.connection_events = {'connects': 0, 'invalidations': 0}
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        engine.connection_events['connects'] += 1
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        engine.connection_events['invalidations'] += 1
+
+def setup_pool_stats(app):
+    with app.app_context():
+        track_connection_events(db.engine)
+
+    @app.route('/pool/stats', methods=['GET'])
+    def get_pool_stats():
+        # The session's bind is the engine actually serving this process (sync or async mode)
+        return jsonify({'msg': 'ok', 'data': pool_stats(db.session.get_bind())}), 200
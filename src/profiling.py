@@ -0,0 +1,124 @@
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import tempfile
+import time
+from flask import Response, g, jsonify, request
+from utils import APIException
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT_NAME = re.compile(r'^\w+$')
+
+def profile_files(directory):
+    # File names start with the timestamp, so name order is age order
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith('.pstats')]
+
+def prune(directory, keep):
+    files = profile_files(directory)
+    for path in files[:max(len(files) - keep, 0)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def aggregate(directory):
+    stats = None
+    for path in profile_files(directory):
+        try:
+            if stats is None:
+                stats = pstats.Stats(path)
+            else:
+                stats.add(path)
+        except (OSError, EOFError):
+            # Pruned or still being written by another worker
+            continue
+    return stats
+
+def setup_profiling(app):
+    # Off unless PROFILE_DIR is set; then no hook is registered at all.
+    # PROFILE_SAMPLE_RATE profiles that fraction of requests (default 0), and
+    # a request whose X-Profile-Token header matches PROFILE_TOKEN is always
+    # profiled. The same token guards the /profiles download routes
+    directory = os.environ.get('PROFILE_DIR')
+    if not directory:
+        return
+    sample_rate = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    token = os.environ.get('PROFILE_TOKEN')
+    keep = int(os.environ.get('PROFILE_MAX_FILES', 200))
+    os.makedirs(directory, exist_ok=True)
+
+    def authorized():
+        sent = request.headers.get('X-Profile-Token')
+        return bool(token) and sent is not None and hmac.compare_digest(sent, token)
+
+    @app.before_request
+    def start_profiler():
+        if not (random.random() < sample_rate or authorized()):
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active on this thread (e.g. greenlets sharing it under ASGI)
+            return
+        g.profiler = profiler
+
+    @app.after_request
+    def save_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        endpoint_directory = os.path.join(directory, request.endpoint or 'unmatched')
+        try:
+            os.makedirs(endpoint_directory, exist_ok=True)
+            path = os.path.join(endpoint_directory, f'{time.time():.6f}-{os.getpid()}.pstats')
+            profiler.dump_stats(path)
+            prune(endpoint_directory, keep)
+        except OSError:
+            logger.warning('Could not write profile for %s', request.endpoint, exc_info=True)
+        return response
+
+    def require_token():
+        if not authorized():
+            raise APIException('A valid X-Profile-Token header is required', status_code=403)
+
+    @app.route('/profiles', methods=['GET'])
+    def list_profiles():
+        require_token()
+        endpoints = {name: len(profile_files(os.path.join(directory, name)))
+                     for name in sorted(os.listdir(directory)) if os.path.isdir(os.path.join(directory, name))}
+        return jsonify({'msg': 'ok', 'data': endpoints}), 200
+
+    @app.route('/profiles/<string:endpoint>', methods=['GET'])
+    def get_profile(endpoint):
+        # All samples of one endpoint merged: a pstats file by default
+        # (snakeviz, `python -m pstats`), or ?format=text for the top functions
+        require_token()
+        endpoint_directory = os.path.join(directory, endpoint)
+        stats = aggregate(endpoint_directory) if ENDPOINT_NAME.match(endpoint) and os.path.isdir(endpoint_directory) else None
+        if stats is None:
+            raise APIException(f'No profiles recorded for {endpoint}', status_code=404)
+
+        if request.args.get('format') == 'text':
+            output = io.StringIO()
+            stats.stream = output
+            # Replaces the per-file header lines pstats would print
+            stats.files = [f'{stats.total_calls} calls in {len(profile_files(endpoint_directory))} profiles of {endpoint}']
+            try:
+                stats.sort_stats(request.args.get('sort', 'cumulative')).print_stats(int(request.args.get('limit', 50)))
+            except (KeyError, ValueError):
+                raise APIException('"sort" must be a pstats sort key and "limit" an integer', status_code=400)
+            return Response(output.getvalue(), mimetype='text/plain')
+
+        with tempfile.NamedTemporaryFile(suffix='.pstats') as merged:
+            stats.dump_stats(merged.name)
+            data = merged.read()
+        return Response(data, mimetype='application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename={endpoint}.pstats'})
@@ -0,0 +1,180 @@
+import logging
+import os
+import random
+import threading
+import time
+from flask import current_app, g, has_request_context, jsonify, request
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event, exc
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Requests that only read; everything else runs on the primary
+READ_METHODS = ('GET', 'HEAD')
+STICKY_COOKIE = 'swapi_read_primary'
+
+def replica_urls():
+    # DATABASE_REPLICA_URLS takes a comma-separated list, DATABASE_REPLICA_URL a single one
+    raw = os.environ.get('DATABASE_REPLICA_URLS') or os.environ.get('DATABASE_REPLICA_URL') or ''
+    return [url.strip().replace('postgres://', 'postgresql://') for url in raw.split(',') if url.strip()]
+
+class ReplicaSet:
+    # The replica engines of one process, and which of them are down. A
+    # replica that fails to hand out a connection (or drops one) is skipped
+    # for `retry_seconds`, then tried again
+
+    def __init__(self, engines, retry_seconds=30.0):
+        self.engines = list(engines)
+        self.retry_seconds = retry_seconds
+        self.down_until = {}
+        self.counters = {'replica_reads': 0, 'primary_fallbacks': 0, 'failures': 0}
+        self._lock = threading.Lock()
+        for engine in self.engines:
+            self.watch(engine)
+
+    def watch(self, engine):
+        @event.listens_for(engine, 'handle_error')
+        def on_error(context):
+            if context.is_disconnect:
+                self.mark_down(engine, context.original_exception)
+
+    def healthy(self):
+        now = time.monotonic()
+        return [engine for engine in self.engines if self.down_until.get(engine, 0) <= now]
+
+    def mark_down(self, engine, error):
+        with self._lock:
+            self.counters['failures'] += 1
+            self.down_until[engine] = time.monotonic() + self.retry_seconds
+        logger.warning('Read replica %s is unavailable, retrying it in %ss: %s',
+                       engine.url.render_as_string(hide_password=True), self.retry_seconds, error)
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def dispose(self, close=True):
+        for engine in self.engines:
+            engine.dispose(close=close)
+
+    def stats(self, pool_stats):
+        now = time.monotonic()
+        return dict(self.counters, replicas=[
+            dict(pool_stats(engine), url=engine.url.render_as_string(hide_password=True),
+                 healthy=self.down_until.get(engine, 0) <= now)
+            for engine in self.engines
+        ])
+
+class ReplicaRouting:
+    # Session mixin: during a read-only request, statements go to one healthy
+    # replica, picked on the request's first statement and kept for the rest
+    # of it. get_bind() without a mapper or statement still answers the
+    # primary, so dialect checks and /pool/stats are unaffected
+
+    def __init__(self, *args, replicas=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+
+    def replica_set(self):
+        return self.replicas if self.replicas is not None else current_app.extensions.get('replicas')
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and (mapper is not None or clause is not None):
+            replica = self.read_replica()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def read_replica(self):
+        if not has_request_context() or not g.get('read_replica'):
+            return None
+        if 'replica_bind' in g:
+            return g.replica_bind
+        replicas = self.replica_set()
+        if replicas is None:
+            return None
+
+        candidates = replicas.healthy()
+        random.shuffle(candidates)
+        g.replica_bind = None
+        for engine in candidates:
+            try:
+                # Checks the connection out into this session's transaction
+                # now, where the statement would otherwise fail later
+                self.connection(bind_arguments={'bind': engine})
+            except exc.DBAPIError as error:
+                replicas.mark_down(engine, error)
+                continue
+            g.replica_bind = engine
+            replicas.count('replica_reads')
+            return engine
+        replicas.count('primary_fallbacks')
+        return None
+
+class RoutingSession(ReplicaRouting, FlaskSession):
+    # db.session (see models.py)
+    pass
+
+class AsyncRoutingSession(ReplicaRouting, Session):
+    # The sync session behind asgi.py's AsyncSession
+    pass
+
+def read_only(view):
+    # For views that only read but aren't GETs (POST /batch): routed like a GET,
+    # and they don't pin the client to the primary
+    view.read_only = True
+    return view
+
+def is_read_request():
+    if request.method in READ_METHODS:
+        return True
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'read_only', False)
+
+def read_from_primary():
+    # For the rest of this request, e.g. before filling a shared cache that
+    # must not be populated from a lagging replica
+    g.read_replica = False
+
+def sticky_until():
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+        return 0
+
+def setup_replicas(app):
+    # Off unless DATABASE_REPLICA_URL(S) is set. GET and HEAD requests read from
+    # a replica; after a client's own write, a cookie pins its reads to the
+    # primary for REPLICA_STICKY_SECONDS (default 5) so it sees that write
+    # even while the replicas lag. Unreachable replicas are skipped for
+    # REPLICA_RETRY_SECONDS (default 30); with none left reads use the primary
+    urls = replica_urls()
+    if not urls:
+        return
+    # models (and pool, through it) import this module for RoutingSession
+    from sqlalchemy import create_engine
+    from models import db
+    from pool import engine_options, pool_stats, track_connection_events
+
+    engines = [create_engine(url, **engine_options(url)) for url in urls]
+    for engine in engines:
+        track_connection_events(engine)
+    replicas = ReplicaSet(engines, retry_seconds=float(os.environ.get('REPLICA_RETRY_SECONDS', 30)))
+    app.extensions['replicas'] = replicas
+    sticky_seconds = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+    @app.before_request
+    def route_reads():
+        g.read_replica = is_read_request() and sticky_until() <= time.time()
+
+    @app.after_request
+    def stick_to_primary(response):
+        if not is_read_request() and response.status_code < 400 and sticky_seconds > 0:
+            response.set_cookie(STICKY_COOKIE, str(int(time.time()) + sticky_seconds),
+                                max_age=sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
+    @app.route('/replicas/stats', methods=['GET'])
+    def get_replica_stats():
+        return jsonify({'msg': 'ok', 'data': db.session().replica_set().stats(pool_stats)}), 200
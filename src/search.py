@@ -0,0 +1,222 @@
+import threading
+from bisect import bisect_left, insort
+from itertools import chain
+from flask import g, jsonify, request
+from sqlalchemy import delete, event, func, insert, inspect, literal, select, union_all
+from sqlalchemy.orm import Session
+from models import db, NameChange, Planets, Vehicles, Characters
+from utils import APIException, IN_CHUNK_SIZE
+from versioning import current_versions
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# kind -> (model, primary key column); the kinds are also the version keys the index follows
+SEARCH_SOURCES = {
+    'planets': (Planets, Planets.planet_id),
+    'vehicles': (Vehicles, Vehicles.vehicle_id),
+    'characters': (Characters, Characters.character_id),
+}
+SEARCH_KEYS = list(SEARCH_SOURCES)
+SEARCH_KINDS = {model: kind for kind, (model, pk) in SEARCH_SOURCES.items()}
+
+# name_changes keeps this many entries; a worker further behind rebuilds
+CHANGES_KEPT = 10000
+# Change ids are handed out before commit, so a lower id can still commit
+# after a higher one was read: each refresh looks back this far for them
+CHANGES_OVERLAP = 1000
+# Past this many changed rows at once, a rebuild is cheaper than applying them
+MAX_APPLIED_CHANGES = 2000
+
+EXACT, PREFIX, SUBSTRING = 0, 1, 2
+MATCH_NAMES = {EXACT: 'exact', PREFIX: 'prefix', SUBSTRING: 'substring'}
+
+def ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+def key_grams(key):
+    return ngrams(key, 1) | ngrams(key, 2) | ngrams(key, 3)
+
+class NameIndex:
+    # Entries are (casefolded name, kind, id, name) tuples, updated row by row
+    # with add() and remove(). Callers hold SearchIndex's lock.
+    #   - prefix: bisect over the entries, kept sorted
+    #   - substring: postings of every 1-, 2- and 3-gram, each a sorted list
+    #     of the same entries. Queries of up to three characters walk one
+    #     list; longer ones walk their rarest trigram's list and check each
+    #     entry. Both stop as soon as `limit` results are found
+
+    def __init__(self, rows):
+        self.entries = sorted((name.casefold(), kind, entity_id, name) for kind, entity_id, name in rows)
+        self.by_id = {(entry[1], entry[2]): entry for entry in self.entries}
+        self.grams = {}
+        for entry in self.entries:
+            for gram in key_grams(entry[0]):
+                self.grams.setdefault(gram, []).append(entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, kind, entity_id, name):
+        entry = (name.casefold(), kind, entity_id, name)
+        self.by_id[(kind, entity_id)] = entry
+        insort(self.entries, entry)
+        for gram in key_grams(entry[0]):
+            insort(self.grams.setdefault(gram, []), entry)
+
+    def remove(self, kind, entity_id):
+        entry = self.by_id.pop((kind, entity_id), None)
+        if entry is None:
+            return
+        del self.entries[bisect_left(self.entries, entry)]
+        for gram in key_grams(entry[0]):
+            postings = self.grams[gram]
+            del postings[bisect_left(postings, entry)]
+            if not postings:
+                del self.grams[gram]
+
+    def substring_candidates(self, query):
+        if len(query) <= 3:
+            return self.grams.get(query, ())
+        return min((self.grams.get(gram, ()) for gram in ngrams(query, 3)), key=len)
+
+    def search(self, query, limit):
+        # Ranked exact > prefix > substring, alphabetical within each rank
+        query = query.casefold()
+        ranked = []
+        # Every key starting with `query` sorts right after (query,)
+        for position in range(bisect_left(self.entries, (query,)), len(self.entries)):
+            entry = self.entries[position]
+            if len(ranked) == limit or not entry[0].startswith(query):
+                break
+            ranked.append((entry, EXACT if entry[0] == query else PREFIX))
+        if len(ranked) < limit:
+            for entry in self.substring_candidates(query):
+                if query in entry[0] and not entry[0].startswith(query):
+                    ranked.append((entry, SUBSTRING))
+                    if len(ranked) == limit:
+                        break
+        ranked.sort(key=lambda item: item[1])
+        return [
+            {'kind': entry[1], 'id': entry[2], 'name': entry[3], 'match': MATCH_NAMES[match]}
+            for entry, match in ranked
+        ]
+
+def load_entries():
+    stmt = union_all(*[
+        select(literal(kind).label('kind'), pk.label('id'), model.name.label('name')).where(model.name.isnot(None))
+        for kind, (model, pk) in SEARCH_SOURCES.items()
+    ])
+    return db.session.execute(stmt).all()
+
+def load_names(kind, ids):
+    model, pk = SEARCH_SOURCES[kind]
+    ids = list(ids)
+    names = {}
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        chunk = ids[start:start + IN_CHUNK_SIZE]
+        names.update(db.session.execute(select(pk, model.name).where(pk.in_(chunk), model.name.isnot(None))).all())
+    return names
+
+def record_name_changes(connection, changes):
+    # Runs in the writing transaction. `changes` is a list of (kind, id)
+    connection.execute(insert(NameChange.__table__), [{'kind': kind, 'entity_id': entity_id} for kind, entity_id in changes])
+    newest = connection.execute(select(func.max(NameChange.id))).scalar()
+    connection.execute(delete(NameChange.__table__).where(NameChange.id <= newest - CHANGES_KEPT))
+
+@event.listens_for(Session, 'after_flush')
+def log_name_changes(session, flush_context):
+    # ORM writes to the searchable models, from any session (the API, the
+    # admin, asgi.py); bulk.py's Core inserts call record_name_changes itself
+    changes = []
+    for obj in chain(session.new, session.dirty, session.deleted):
+        kind = SEARCH_KINDS.get(type(obj))
+        if kind is None:
+            continue
+        if obj in session.dirty and not inspect(obj).attrs.name.history.has_changes():
+            continue
+        changes.append((kind, getattr(obj, SEARCH_SOURCES[kind][1].key)))
+    if changes:
+        record_name_changes(session.connection(), changes)
+
+class SearchIndex:
+    # This process's NameIndex. When the planets/vehicles/characters version
+    # counters move (a write from any worker), the rows logged in
+    # name_changes since the last refresh are re-read and applied one by one.
+    # It is only built from scratch on first use, after a very large batch of
+    # changes, or when this process fell further behind than the log reaches
+
+    def __init__(self):
+        self.index = None
+        self.versions = None
+        self.last_change = 0
+        # Ids within CHANGES_OVERLAP of last_change that were already applied
+        self.applied = set()
+        self._lock = threading.Lock()
+
+    def search(self, versions, query, limit):
+        with self._lock:
+            if self.index is None or self.versions != versions:
+                self.refresh()
+                self.versions = versions
+            return self.index.search(query, limit)
+
+    def rebuild(self):
+        # Change ids first: anything logged while the entries load is applied by the next refresh
+        self.applied = set(db.session.execute(
+            select(NameChange.id).where(NameChange.id > select(func.max(NameChange.id)).scalar_subquery() - CHANGES_OVERLAP)
+        ).scalars())
+        self.last_change = max(self.applied, default=0)
+        self.index = NameIndex(load_entries())
+
+    def refresh(self):
+        if self.index is None:
+            return self.rebuild()
+        oldest = db.session.execute(select(func.min(NameChange.id))).scalar()
+        if oldest is not None and oldest > self.last_change + 1:
+            # Entries this process never saw may have been pruned
+            return self.rebuild()
+        changes = [
+            change for change in db.session.execute(
+                select(NameChange.id, NameChange.kind, NameChange.entity_id)
+                .where(NameChange.id > self.last_change - CHANGES_OVERLAP)
+            ).all()
+            if change.id not in self.applied
+        ]
+        if len(changes) > MAX_APPLIED_CHANGES:
+            return self.rebuild()
+
+        changed = {}
+        for change in changes:
+            changed.setdefault(change.kind, set()).add(change.entity_id)
+        for kind, ids in changed.items():
+            names = load_names(kind, ids)
+            for entity_id in ids:
+                self.index.remove(kind, entity_id)
+                if entity_id in names:
+                    self.index.add(kind, entity_id, names[entity_id])
+
+        self.applied.update(change.id for change in changes)
+        self.last_change = max(self.applied, default=self.last_change)
+        self.applied = {change_id for change_id in self.applied if change_id > self.last_change - CHANGES_OVERLAP}
+
+search_index = SearchIndex()
+
+def read_search_args():
+    query = request.args.get('q', '').strip()
+    if not query:
+        raise APIException('"q" is required', status_code=400)
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SEARCH_LIMIT))
+    except ValueError:
+        raise APIException('"limit" must be an integer', status_code=400)
+    if limit < 1 or limit > MAX_SEARCH_LIMIT:
+        raise APIException(f'"limit" must be between 1 and {MAX_SEARCH_LIMIT}', status_code=400)
+    return query, limit
+
+def search_names():
+    query, limit = read_search_args()
+    # @versioned has already read the versions for the ETag; reuse them
+    versions = g.get('resource_versions') or current_versions(SEARCH_KEYS)
+    results = search_index.search({key: versions[key] for key in SEARCH_KEYS}, query, limit)
+    return jsonify({'msg': 'ok', 'data': results})
@@ -1,4 +1,11 @@
-from flask import jsonify, url_for
+import os
+import sys
+from flask import jsonify
+
+# Keeps each IN (...) under SQLite's bound-parameter limit
+IN_CHUNK_SIZE = 900
+# Range of a 4-byte INTEGER column
+INTEGER_MIN, INTEGER_MAX = -2 ** 31, 2 ** 31 - 1
 
 class APIException(Exception):
     status_code = 400
@@ -21,12 +28,14 @@ def has_no_empty_params(rule):
     return len(defaults) >= len(arguments)
 
 def generate_sitemap(app):
+    # Called once at startup, outside any request, so URLs are built from an unbound adapter
+    adapter = app.url_map.bind('localhost')
     links = ['/admin/']
     for rule in app.url_map.iter_rules():
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
         if "GET" in rule.methods and has_no_empty_params(rule):
-            url = url_for(rule.endpoint, **(rule.defaults or {}))
+            url = adapter.build(rule.endpoint, rule.defaults or {})
             if "/admin/" not in url:
                 links.append(url)
 
@@ -39,3 +48,27 @@ def generate_sitemap(app):
         <p>Start working on your proyect by following the <a href="https://start.4geeksacademy.com/starters/flask" target="_blank">Quick Start</a></p>
         <p>Remember to specify a real endpoint path like: </p>
         <ul style="text-align: left;">"""+links_html+"</ul></div>"
+
+def running_flask_cli():
+    # True under `flask ...` / `python -m flask ...`, false under gunicorn, uvicorn or `python src/app.py`
+    script = os.path.abspath(sys.argv[0]) if sys.argv and sys.argv[0] else ''
+    return os.path.basename(script) in ('flask', 'flask.exe') or os.path.basename(os.path.dirname(script)) == 'flask'
+
+def dialect_insert(table, bind):
+    # INSERT construct with ON CONFLICT / ON DUPLICATE KEY support for the bound dialect
+    if bind.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif bind.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif bind.dialect.name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+    else:
+        raise NotImplementedError(f'Upserts are not supported on {bind.dialect.name}')
+    return insert(table)
+
+def insert_ignore(table, bind, index_elements):
+    # INSERT that silently skips rows violating the unique index on `index_elements`
+    stmt = dialect_insert(table, bind)
+    if bind.dialect.name == 'mysql':
+        return stmt.prefix_with('IGNORE')
+    return stmt.on_conflict_do_nothing(index_elements=index_elements)
@@ -0,0 +1,57 @@
+import hashlib
+from functools import wraps
+from flask import g, make_response, request
+from sqlalchemy import select
+from models import db, ResourceVersion
+from utils import dialect_insert
+
+def favorites_key(user_id):
+    return f'favorites:{user_id}'
+
+def bump_versions(*keys):
+    # Runs inside the caller's transaction, so the new version becomes
+    # visible in the same commit as the data it describes
+    table = ResourceVersion.__table__
+    bind = db.session.get_bind()
+    stmt = dialect_insert(table, bind).values([{'key': key, 'version': 1} for key in keys])
+    if bind.dialect.name == 'mysql':
+        stmt = stmt.on_duplicate_key_update(version=table.c.version + 1)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=['key'], set_={'version': table.c.version + 1})
+    db.session.execute(stmt)
+
+def current_versions(keys):
+    rows = db.session.execute(
+        select(ResourceVersion.key, ResourceVersion.version).where(ResourceVersion.key.in_(keys))
+    ).all()
+    versions = dict.fromkeys(keys, 0)
+    versions.update(rows)
+    return versions
+
+def make_etag(versions):
+    # The URL is part of the tag because ?fields=, ?limit= and ?after= change the body
+    raw = request.full_path + '|' + ','.join(f'{key}={versions[key]}' for key in sorted(versions))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def versioned(*key_templates):
+    # Conditional GET: key templates are formatted with the view arguments,
+    # e.g. @versioned('favorites:{id_user}', 'planets'). A matching
+    # If-None-Match is answered with 304 after a single version lookup
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            keys = [template.format(**kwargs) for template in key_templates]
+            # Kept on g for views that also key in-process state on the versions (search.py)
+            g.resource_versions = current_versions(keys)
+            etag = make_etag(g.resource_versions)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+                response.set_etag(etag)
+                return response
+
+            response = make_response(view(**kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,164 @@
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from sqlalchemy.util import await_only
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ('commit', 'queued')
+STOP = object()
+
+class QueueFull(Exception):
+    pass
+
+class PendingWrite:
+    # One queued item. `done` is set once its batch is committed (error is
+    # None) or has failed (error is the exception)
+
+    __slots__ = ('key', 'value', 'done', 'error')
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+        self.done = threading.Event()
+        self.error = None
+
+    def wait(self, timeout):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return self.done.wait(timeout)
+        # Under asgi.py the view runs in a greenlet on the event loop thread;
+        # wait in a worker thread instead of blocking every other request
+        return await_only(asyncio.to_thread(self.done.wait, timeout))
+
+class WriteBehindQueue:
+    # Bounded in-process queue drained by one background thread. The thread
+    # takes the first waiting item, gathers more for up to `flush_seconds` or
+    # until `batch_size`, and hands them all to `apply`, which writes them in
+    # a single transaction. If that transaction fails, every item is retried
+    # on its own, so one bad item only fails itself.
+    #
+    # The thread is started by the first submit() of each process, never in a
+    # gunicorn master that forks workers afterwards
+
+    def __init__(self, name, apply):
+        self.name = name
+        self.apply = apply
+        self.enabled = False
+        self.app = None
+        self.max_size = 10000
+        self.batch_size = 500
+        self.flush_seconds = 0.005
+        self.durability = 'commit'
+        self.commit_timeout = 5.0
+        self.counters = {'submitted': 0, 'rejected': 0, 'flushed': 0, 'batches': 0, 'failed': 0}
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+
+    def configure(self, app, max_size, batch_size, flush_seconds, durability, commit_timeout):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f'Unknown durability {durability!r}, expected one of: {", ".join(DURABILITY_MODES)}')
+        self.app = app
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.durability = durability
+        self.commit_timeout = commit_timeout
+        self.enabled = True
+        atexit.register(self.close)
+
+    def latest(self, key):
+        # The newest queued item for `key` that isn't committed yet, if any
+        return self._latest.get(key)
+
+    def submit(self, key, value):
+        item = PendingWrite(key, value)
+        with self._lock:
+            self.ensure_thread()
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self.counters['rejected'] += 1
+                raise QueueFull(self.name)
+            self._latest[key] = item
+            self.counters['submitted'] += 1
+        return item
+
+    def ensure_thread(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        if self._pid != os.getpid():
+            # A forked child inherits the parent's queue object but not its thread
+            self._queue = queue.Queue(self.max_size)
+            self._latest = {}
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self.run, name=f'{self.name}-write-behind', daemon=True)
+        self._thread.start()
+
+    def run(self):
+        while True:
+            item = self._queue.get()
+            if item is STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is STOP:
+                    self.flush(batch)
+                    return
+                batch.append(item)
+            self.flush(batch)
+
+    def flush(self, batch):
+        with self.app.app_context():
+            try:
+                self.apply([item.value for item in batch])
+            except Exception:
+                logger.warning('%s write-behind batch of %s failed, retrying item by item',
+                               self.name, len(batch), exc_info=True)
+                for item in batch:
+                    try:
+                        self.apply([item.value])
+                    except Exception as e:
+                        logger.error('%s write-behind item %r failed', self.name, item.value, exc_info=True)
+                        item.error = e
+        with self._lock:
+            self.counters['batches'] += 1
+            for item in batch:
+                self.counters['failed' if item.error is not None else 'flushed'] += 1
+                if self._latest.get(item.key) is item:
+                    del self._latest[item.key]
+        for item in batch:
+            item.done.set()
+
+    def close(self, timeout=10.0):
+        # Writes out everything still queued and stops the thread (atexit and
+        # gunicorn's worker_exit). Later mutations take the synchronous path
+        self.enabled = False
+        with self._lock:
+            thread = self._thread if self._pid == os.getpid() else None
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.error('%s write-behind queue did not drain within %ss, %s items left',
+                         self.name, timeout, self._queue.qsize())
+
+    def stats(self):
+        with self._lock:
+            depth = self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+            return dict(self.counters, depth=depth, max_size=self.max_size, batch_size=self.batch_size,
+                        flush_ms=self.flush_seconds * 1000, durability=self.durability)
@@ -0,0 +1,71 @@
+import os
+import sys
+
+# The app reads its configuration at import time
+os.environ['DATABASE_URL'] = 'sqlite://'
+# Installs the replica routing hooks; each test picks the replica engines it wants
+os.environ['DATABASE_REPLICA_URL'] = 'sqlite://'
+# Registers the admin on the app itself, so its views share the in-memory database
+os.environ['ADMIN_LAZY'] = 'false'
+for variable in ('DATABASE_REPLICA_URLS', 'CACHE_REDIS_URL', 'PROFILE_DIR', 'FAVORITES_WRITE_BEHIND'):
+    os.environ.pop(variable, None)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import pytest
+from sqlalchemy import event
+from app import app as flask_app
+import search
+from cache import response_cache
+from models import db, User, Planets, Vehicles, Characters
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+    response_cache.local.clear()
+    response_cache.shared = None
+    response_cache.counters = dict.fromkeys(response_cache.counters, 0)
+    search.search_index = search.SearchIndex()
+    flask_app.extensions['replicas'].engines = []
+    yield flask_app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def seed(app):
+    # seed(planets=3, ...) adds that many rows of each kind, named "Planet 1", ...
+    def add(users=0, planets=0, vehicles=0, characters=0):
+        with app.app_context():
+            for i in range(1, users + 1):
+                db.session.add(User(user_name=f'user{i}', email=f'user{i}@test.local', password='secret', is_active=True))
+            for i in range(1, planets + 1):
+                db.session.add(Planets(name=f'Planet {i}', diameter=i, population=i * 1000, duration_day=24, terrain='desert'))
+            for i in range(1, vehicles + 1):
+                db.session.add(Vehicles(name=f'Vehicle {i}', crew=i, model='X', lenght=i, cargo_capacity=i))
+            for i in range(1, characters + 1):
+                db.session.add(Characters(name=f'Character {i}', skin_color='fair', birth_year='19BBY', gender='male', height=170))
+            db.session.commit()
+    return add
+
+@pytest.fixture
+def statements(app):
+    # statements(engine) -> list that collects every SQL statement the engine runs
+    listeners = []
+
+    def collect(engine=None):
+        with app.app_context():
+            engine = engine or db.engine
+        collected = []
+
+        def on_execute(conn, cursor, statement, *args):
+            collected.append(statement)
+        event.listen(engine, 'before_cursor_execute', on_execute)
+        listeners.append((engine, on_execute))
+        return collected
+
+    yield collect
+    for engine, listener in listeners:
+        event.remove(engine, 'before_cursor_execute', listener)
@@ -0,0 +1,42 @@
+import re
+from sqlalchemy import event
+from models import db
+
+def listed_names(client, search):
+    page = client.get(f'/admin/planets/?search={search}').get_data(as_text=True)
+    return re.findall(r'^\s+(Planet \d+)\s*$', page, re.M)
+
+def test_admin_search_is_a_prefix_match(client, seed):
+    seed(planets=12)
+    assert listed_names(client, 'Planet 1') == ['Planet 1', 'Planet 10', 'Planet 11', 'Planet 12']
+    assert listed_names(client, 'lanet') == []
+
+def test_admin_search_escapes_wildcards(client, seed):
+    seed(planets=2)
+    assert listed_names(client, 'Pl_net') == []
+    assert listed_names(client, '%') == []
+
+def test_admin_search_is_index_backed_on_sqlite(app, client, seed):
+    # With the NOCASE index migration d2b9e4f7a1c5 creates on SQLite
+    seed(planets=2)
+    with app.app_context():
+        db.session.execute(db.text('CREATE INDEX ix_planets_name_pattern ON planets (name COLLATE NOCASE)'))
+        db.session.commit()
+        engine = db.engine
+    searches = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if 'LIKE' in statement:
+            searches.append((statement, parameters))
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        client.get('/admin/planets/?search=Planet 1')
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+
+    assert searches
+    with engine.connect() as connection:
+        for statement, parameters in searches:
+            assert 'Planet 1%' in parameters
+            plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+            assert any('ix_planets_name_pattern' in row[-1] for row in plan), plan
@@ -0,0 +1,15 @@
+from werkzeug.wrappers import Request
+from asgi import build_environ
+
+def scope(headers):
+    return {'type': 'http', 'method': 'POST', 'path': '/planets/bulk', 'query_string': b'',
+            'http_version': '1.1', 'headers': headers}
+
+def test_chunked_body_is_readable():
+    # Chunked requests carry no Content-Length
+    environ = build_environ(scope([(b'content-type', b'application/json')]), b'[{"name": "Hoth"}]')
+    assert Request(environ).get_json() == [{'name': 'Hoth'}]
+
+def test_body_with_content_length():
+    environ = build_environ(scope([(b'content-type', b'application/json'), (b'content-length', b'2')]), b'[]')
+    assert Request(environ).get_json() == []
@@ -0,0 +1,28 @@
+from models import db
+
+def test_batch_runs_each_sub_request(client, seed):
+    seed(planets=2, vehicles=1)
+    response = client.post('/batch', json={'requests': ['/planet/1', {'path': '/vehicles?ids=1'}, '/planet/99']})
+    assert response.status_code == 207
+    items = response.get_json()['data']
+    assert [item['status'] for item in items] == [200, 200, 404]
+    assert items[0]['body']['data']['name'] == 'Planet 1'
+    assert [vehicle['name'] for vehicle in items[1]['body']['data']] == ['Vehicle 1']
+
+def test_unhandled_error_fails_only_its_item(app, client, seed, monkeypatch):
+    seed(planets=2)
+
+    def broken():
+        # Leaves the shared session in a failed transaction, like a database error would
+        db.session.execute(db.text('SELECT * FROM no_such_table'))
+    monkeypatch.setitem(app.view_functions, 'get_all_planets', broken)
+
+    response = client.post('/batch', json={'requests': ['/planets', '/planet/2']})
+    assert response.status_code == 207
+    items = response.get_json()['data']
+    assert [item['status'] for item in items] == [500, 200]
+    assert items[1]['body']['data']['name'] == 'Planet 2'
+
+def test_batch_rejects_non_get_sub_requests(client):
+    response = client.post('/batch', json={'requests': [{'method': 'DELETE', 'path': '/planet/1'}]})
+    assert response.status_code == 400
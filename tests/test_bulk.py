@@ -0,0 +1,34 @@
+from models import db, Planets
+
+def planet(name, **fields):
+    return dict({'name': name, 'diameter': 100, 'population': 1000, 'duration_day': 24, 'terrain': 'desert'}, **fields)
+
+def test_bulk_create_reports_invalid_rows_one_by_one(app, client):
+    rows = [
+        planet('Tatooine'),
+        planet('Hoth', diameter='big'),
+        planet('X' * 51),
+        planet('Dagobah', terrain=['swamp']),
+        planet('Bespin', population=2 ** 40),
+        planet('Endor', diameter=True),
+        planet('Naboo', terrain=None),
+        planet(None),
+    ]
+    response = client.post('/planets/bulk', json=rows)
+    assert response.status_code == 207
+    results = response.get_json()['data']
+    assert [result['status'] for result in results] == [201, 400, 400, 400, 400, 400, 201, 400]
+    assert results[1]['msg'] == 'Field "diameter" must be an integer'
+    assert results[2]['msg'] == 'Field "name" can be at most 50 characters long'
+    assert results[3]['msg'] == 'Field "terrain" must be a string'
+    assert results[4]['msg'] == 'Field "population" is out of range'
+    assert results[7]['msg'] == 'Field "name" can\'t be null'
+
+    with app.app_context():
+        assert sorted(db.session.execute(db.select(Planets.name)).scalars()) == ['Naboo', 'Tatooine']
+
+def test_bulk_create_rejects_duplicates(client):
+    client.post('/planets/bulk', json=[planet('Tatooine')])
+    response = client.post('/planets/bulk', json=[planet('Tatooine'), planet('Hoth'), planet('Hoth')])
+    assert response.status_code == 207
+    assert [result['status'] for result in response.get_json()['data']] == [400, 201, 400]
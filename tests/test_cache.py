@@ -0,0 +1,45 @@
+import cache
+from cache import response_cache
+
+def planet(name):
+    return {'name': name, 'diameter': 1, 'population': 2, 'duration_day': 3, 'terrain': 'desert'}
+
+def test_cached_body_follows_updates(client, seed):
+    seed(planets=1)
+    assert client.get('/planet/1').get_json()['data']['name'] == 'Planet 1'
+    assert client.put('/planet/1', json=planet('Tatooine')).status_code == 200
+    assert client.get('/planet/1').get_json()['data']['name'] == 'Tatooine'
+
+def test_hit_runs_no_statements(client, seed, statements):
+    seed(planets=1)
+    miss = client.get('/planet/1')
+    etag = miss.headers['ETag']
+
+    executed = statements()
+    hit = client.get('/planet/1')
+    assert hit.status_code == 200
+    assert hit.get_data() == miss.get_data()
+    assert hit.headers['ETag'] == etag
+    assert client.get('/planet/1', headers={'If-None-Match': etag}).status_code == 304
+    assert executed == []
+
+def test_write_to_another_entity_keeps_the_entry(client, seed):
+    seed(planets=2)
+    client.get('/planet/1')
+    assert client.put('/planet/2', json=planet('Hoth')).status_code == 200
+    assert response_cache.local.get('planet:1') is not None
+    assert response_cache.local.get('planet:2') is None
+
+def test_entry_read_before_a_concurrent_write_is_not_kept(client, seed, monkeypatch):
+    seed(planets=1)
+    # As if a PUT committed (and deleted the key) while this miss read the planet
+    monkeypatch.setattr(cache, 'current_versions', lambda keys: dict.fromkeys(keys, 99))
+    assert client.get('/planet/1').status_code == 200
+    assert response_cache.local.get('planet:1') is None
+
+def test_counters(client, seed):
+    seed(planets=1)
+    client.get('/planet/1')
+    client.get('/planet/1')
+    stats = client.get('/cache/stats').get_json()['data']
+    assert (stats['misses'], stats['local_hits']) == (1, 1)
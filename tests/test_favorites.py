@@ -0,0 +1,34 @@
+from models import db, FavoritePlanets, FavoriteVehicles, FavoriteCharacters
+
+def add_favorites(app, user_id, planets=0, vehicles=0, characters=0):
+    with app.app_context():
+        db.session.add_all(
+            [FavoritePlanets(user_id=user_id, planet_id=i) for i in range(1, planets + 1)]
+            + [FavoriteVehicles(user_id=user_id, vehicle_id=i) for i in range(1, vehicles + 1)]
+            + [FavoriteCharacters(user_id=user_id, character_id=i) for i in range(1, characters + 1)]
+        )
+        db.session.commit()
+
+def test_favorites_statement_count_does_not_grow_with_favorites(app, client, seed, statements):
+    seed(users=2, planets=70, vehicles=65, characters=65)
+    add_favorites(app, 1, planets=1)
+    add_favorites(app, 2, planets=70, vehicles=65, characters=65)
+
+    executed = statements()
+    response = client.get('/user/1/favorites')
+    assert response.status_code == 200
+    assert len(response.get_json()['data']['favorite_planets']) == 1
+    few = len(executed)
+
+    executed.clear()
+    response = client.get('/user/2/favorites')
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert sum(len(data[key]) for key in data) == 200
+    many = len(executed)
+
+    assert few == many
+
+def test_favorites_of_missing_user(client, seed):
+    seed(users=1)
+    assert client.get('/user/99/favorites').status_code == 404
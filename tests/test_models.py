@@ -0,0 +1,5 @@
+from models import NameChange, ResourceVersion
+
+def test_serialize_returns_each_models_own_columns():
+    assert ResourceVersion(key='planets', version=3).serialize() == {'key': 'planets', 'version': 3}
+    assert NameChange(id=1, kind='planets', entity_id=7).serialize() == {'id': 1, 'kind': 'planets', 'entity_id': 7}
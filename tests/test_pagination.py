@@ -0,0 +1,76 @@
+import base64
+import json
+import pytest
+
+def cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def page(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    body = response.get_json()
+    return [planet['name'] for planet in body['data']], body['next']
+
+def test_pk_pages_follow_the_next_link(client, seed):
+    seed(planets=5)
+    names, next_url = page(client, '/planets?limit=2')
+    assert names == ['Planet 1', 'Planet 2']
+    names, next_url = page(client, next_url)
+    assert names == ['Planet 3', 'Planet 4']
+    names, next_url = page(client, next_url)
+    assert (names, next_url) == (['Planet 5'], None)
+
+@pytest.mark.parametrize('values', [[{'a': 1}], ['abc'], [1, 2, 3], [None], [True], [2 ** 40], []])
+def test_tampered_pk_cursor_is_a_400(client, seed, values):
+    seed(planets=2)
+    response = client.get(f'/planets?after={cursor(values)}')
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Invalid "after" cursor'
+
+def add_planets(app, diameters):
+    # "P<i>" with the given diameter (None for a NULL), in primary key order
+    from models import db, Planets
+    with app.app_context():
+        for i, diameter in enumerate(diameters, 1):
+            db.session.add(Planets(name=f'P{i}', diameter=diameter))
+        db.session.commit()
+
+def all_pages(client, url):
+    names = []
+    while url:
+        page_names, url = page(client, url)
+        names += page_names
+    return names
+
+def test_sorted_pages_cross_into_the_null_tail(app, client):
+    add_planets(app, [30, None, 10, 20, None, 10])
+    assert all_pages(client, '/planets?sort=diameter&limit=2') == ['P3', 'P6', 'P4', 'P1', 'P2', 'P5']
+    assert all_pages(client, '/planets?sort=-diameter&limit=2') == ['P1', 'P4', 'P6', 'P3', 'P2', 'P5']
+    # A page boundary right at the last non-NULL row, and one inside the tail
+    assert all_pages(client, '/planets?sort=diameter&limit=4') == ['P3', 'P6', 'P4', 'P1', 'P2', 'P5']
+    assert all_pages(client, '/planets?sort=-diameter&limit=5') == ['P1', 'P4', 'P6', 'P3', 'P2', 'P5']
+
+def test_sorted_pages_with_fields_leaving_out_the_sort_column(app, client):
+    add_planets(app, [30, None, 10, 20])
+    url = '/planets?sort=diameter&fields=name&limit=1'
+    names = []
+    while url:
+        response = client.get(url)
+        body = response.get_json()
+        # The primary key is always selected; the sort column only feeds the cursor
+        assert [set(planet) for planet in body['data']] == [{'planet_id', 'name'}]
+        names += [planet['name'] for planet in body['data']]
+        url = body['next']
+    assert names == ['P3', 'P4', 'P1', 'P2']
+
+@pytest.mark.parametrize('values', [[10], [10, 1, 2], ['abc', 1], [10, 'x'], [10, None], [{'a': 1}, 1], [10, True], [2 ** 40, 1]])
+def test_tampered_sorted_cursor_is_a_400(app, client, values):
+    add_planets(app, [30, None])
+    response = client.get(f'/planets?sort=diameter&after={cursor(values)}')
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Invalid "after" cursor'
+
+def test_null_sort_value_in_cursor_is_accepted(app, client):
+    add_planets(app, [30, None, None])
+    names, next_url = page(client, f'/planets?sort=diameter&after={cursor([None, 2])}')
+    assert names == ['P3']
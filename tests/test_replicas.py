@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import create_engine, insert
+from models import db, Planets
+from replicas import STICKY_COOKIE, ReplicaSet
+
+@pytest.fixture
+def replica(app, tmp_path, monkeypatch):
+    # A replica that lags: it has the schema but only the rows given to it
+    engine = create_engine(f'sqlite:///{tmp_path / "replica.db"}')
+    db.metadata.create_all(engine)
+    replicas = ReplicaSet([engine])
+    monkeypatch.setitem(app.extensions, 'replicas', replicas)
+    yield engine
+    engine.dispose()
+
+def add_replica_planet(engine, name):
+    with engine.begin() as connection:
+        connection.execute(insert(Planets.__table__).values(name=name))
+
+def planet_names(client, path='/planets'):
+    response = client.get(path)
+    assert response.status_code == 200
+    return [planet['name'] for planet in response.get_json()['data']]
+
+def test_reads_go_to_the_replica(app, client, seed, replica):
+    seed(planets=1)
+    add_replica_planet(replica, 'Replica planet')
+    assert planet_names(client) == ['Replica planet']
+    assert app.extensions['replicas'].counters['replica_reads'] == 1
+
+def test_writes_pin_the_client_to_the_primary(client, seed, replica):
+    seed(planets=1)
+    body = {'name': 'Hoth', 'diameter': 1, 'population': 2, 'duration_day': 3, 'terrain': 'ice'}
+    response = client.post('/planet', json=body)
+    assert response.status_code == 201
+    assert STICKY_COOKIE in response.headers['Set-Cookie']
+    # The replica hasn't caught up, but this client reads its own write
+    assert planet_names(client) == ['Planet 1', 'Hoth']
+
+    client.delete_cookie('localhost', STICKY_COOKIE)
+    assert planet_names(client) == []
+
+def test_batch_reads_from_the_replica_without_pinning(client, seed, replica):
+    seed(planets=1)
+    add_replica_planet(replica, 'Replica planet')
+    response = client.post('/batch', json={'requests': ['/planets']})
+    assert response.status_code == 200
+    assert 'Set-Cookie' not in response.headers
+    assert [planet['name'] for planet in response.get_json()['data'][0]['body']['data']] == ['Replica planet']
+
+def test_unreachable_replica_falls_back_to_the_primary(app, client, seed, monkeypatch):
+    seed(planets=1)
+    broken = create_engine('sqlite:////nonexistent/replica.db')
+    monkeypatch.setitem(app.extensions, 'replicas', ReplicaSet([broken], retry_seconds=60))
+
+    assert planet_names(client) == ['Planet 1']
+    assert planet_names(client) == ['Planet 1']
+    stats = client.get('/replicas/stats').get_json()['data']
+    # Marked down on the first failure, then skipped by the second read
+    assert stats['failures'] == 1
+    assert stats['primary_fallbacks'] == 2
+    assert stats['replicas'][0]['healthy'] is False
@@ -0,0 +1,73 @@
+import search
+from models import db, NameChange, Planets
+from versioning import bump_versions
+
+def names(client, query):
+    response = client.get(f'/search?q={query}')
+    assert response.status_code == 200
+    return [(result['name'], result['match']) for result in response.get_json()['data']]
+
+def planet(name):
+    return {'name': name, 'diameter': 1, 'population': 2, 'duration_day': 3, 'terrain': 'desert'}
+
+def test_ranked_matches(client, seed):
+    seed(planets=2, vehicles=1)
+    client.post('/planet', json=planet('Net'))
+    assert names(client, 'ne') == [('Net', 'prefix'), ('Planet 1', 'substring'), ('Planet 2', 'substring')]
+    assert names(client, 'net') == [('Net', 'exact'), ('Planet 1', 'substring'), ('Planet 2', 'substring')]
+    assert names(client, 'vehicle 1') == [('Vehicle 1', 'exact')]
+    assert names(client, 'zz') == []
+
+def test_writes_are_applied_without_a_rebuild(client, seed):
+    seed(planets=3)
+    assert names(client, 'planet 2') == [('Planet 2', 'exact')]
+    index = search.search_index.index
+
+    client.put('/planet/2', json=planet('Hoth'))
+    client.delete('/planet/3')
+    client.post('/planet', json=planet('Dagobah'))
+    client.post('/planets/bulk', json=[planet('Bespin'), planet('Endor')])
+
+    assert names(client, 'planet') == [('Planet 1', 'prefix')]
+    assert names(client, 'o') == [('Dagobah', 'substring'), ('Endor', 'substring'), ('Hoth', 'substring')]
+    assert names(client, 'bes') == [('Bespin', 'prefix')]
+    assert search.search_index.index is index
+
+def test_admin_edits_are_applied(client, seed):
+    seed(planets=1)
+    assert names(client, 'planet') == [('Planet 1', 'prefix')]
+    form = {'name': 'Kashyyyk', 'diameter': '1', 'population': '2', 'duration_day': '3', 'terrain': 'forest'}
+    assert client.post('/admin/planets/edit/?id=1', data=form).status_code == 302
+    assert names(client, 'planet') == []
+    assert names(client, 'yyy') == [('Kashyyyk', 'substring')]
+
+def commit_change(app, change_id, planet_id, name):
+    # A rename logged under a chosen change id, as a transaction that took that id would
+    with app.app_context():
+        db.session.execute(db.update(Planets).where(Planets.planet_id == planet_id).values(name=name))
+        db.session.execute(db.insert(NameChange).values(id=change_id, kind='planets', entity_id=planet_id))
+        bump_versions('planets')
+        db.session.commit()
+
+def test_late_commit_with_a_lower_change_id_is_applied(app, client, seed):
+    seed(planets=2)
+    names(client, 'planet')
+    last_change = search.search_index.last_change
+    commit_change(app, last_change + 2, 2, 'Yavin')
+    assert names(client, 'a') == [('Planet 1', 'substring'), ('Yavin', 'substring')]
+
+    commit_change(app, last_change + 1, 1, 'Alderaan')
+    assert names(client, 'a') == [('Alderaan', 'prefix'), ('Yavin', 'substring')]
+
+def test_process_behind_the_pruned_log_rebuilds(app, client, seed):
+    seed(planets=1)
+    names(client, 'planet')
+    index = search.search_index.index
+    last_change = search.search_index.last_change
+    commit_change(app, last_change + search.CHANGES_KEPT, 1, 'Mustafar')
+    with app.app_context():
+        db.session.execute(db.delete(NameChange).where(NameChange.id < last_change + search.CHANGES_KEPT))
+        db.session.commit()
+
+    assert names(client, 'mus') == [('Mustafar', 'prefix')]
+    assert search.search_index.index is not index
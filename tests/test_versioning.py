@@ -0,0 +1,66 @@
+from cache import response_cache
+from models import db, Planets
+
+def test_etag_and_not_modified(client, seed):
+    seed(planets=2)
+    response = client.get('/planets')
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+
+    response = client.get('/planets', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+
+def test_write_changes_the_etag(client, seed):
+    seed(planets=2)
+    etag = client.get('/planet/1').headers['ETag']
+    body = {'name': 'Tatooine', 'diameter': 1, 'population': 2, 'duration_day': 3, 'terrain': 'desert'}
+    assert client.put('/planet/1', json=body).status_code == 200
+
+    response = client.get('/planet/1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['data']['name'] == 'Tatooine'
+
+def test_admin_edit_bumps_versions_and_drops_the_cache(app, client, seed):
+    seed(planets=2)
+    etag = client.get('/planet/1').headers['ETag']
+    assert response_cache.local.get('planet:1') is not None
+
+    form = {'name': 'Hoth', 'diameter': '7', 'population': '8', 'duration_day': '9', 'terrain': 'ice'}
+    assert client.post('/admin/planets/edit/?id=1', data=form).status_code == 302
+
+    assert response_cache.local.get('planet:1') is None
+    response = client.get('/planet/1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['data']['name'] == 'Hoth'
+
+def test_admin_delete_bumps_versions_and_drops_the_cache(app, client, seed):
+    seed(planets=2)
+    etag = client.get('/planets').headers['ETag']
+    client.get('/planet/2')
+
+    assert client.post('/admin/planets/delete/', data={'id': '2'}).status_code == 302
+
+    assert response_cache.local.get('planet:2') is None
+    assert client.get('/planets', headers={'If-None-Match': etag}).status_code == 200
+    assert client.get('/planet/2').status_code == 404
+
+def test_admin_favorites_keep_counts_and_versions(app, client, seed):
+    seed(users=1, planets=2)
+    etag = client.get('/user/1/favorites').headers['ETag']
+
+    assert client.post('/admin/favoriteplanets/new/', data={'user_relationship': '1', 'planet_relationship': '2'}).status_code == 302
+    response = client.get('/user/1/favorites', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert [favorite['planet_id'] for favorite in response.get_json()['data']['favorite_planets']] == [2]
+    with app.app_context():
+        assert db.session.get(Planets, 2).favorite_count == 1
+
+    etag = response.headers['ETag']
+    assert client.post('/admin/favoriteplanets/delete/', data={'id': '1'}).status_code == 302
+    response = client.get('/user/1/favorites', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['data']['favorite_planets'] == []
+    with app.app_context():
+        assert db.session.get(Planets, 2).favorite_count == 0
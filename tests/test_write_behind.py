@@ -0,0 +1,119 @@
+import threading
+import pytest
+import favorites
+from models import db, Planets, FavoritePlanets
+from write_behind import WriteBehindQueue
+
+@pytest.fixture
+def make_queue(app, monkeypatch):
+    # A fresh favorites queue per test, drained and stopped afterwards
+    queues = []
+
+    def make(durability='commit', max_size=100, apply=favorites.apply_favorite_changes):
+        queue = WriteBehindQueue('favorites', apply)
+        queue.configure(app, max_size=max_size, batch_size=50, flush_seconds=0.005,
+                        durability=durability, commit_timeout=5)
+        monkeypatch.setattr(favorites, 'favorite_queue', queue)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.close()
+
+def favorite_count(app, planet_id):
+    with app.app_context():
+        return db.session.get(Planets, planet_id).favorite_count
+
+def favorite_planet_ids(client, user_id):
+    return [favorite['planet_id'] for favorite in client.get(f'/user/{user_id}/favorites').get_json()['data']['favorite_planets']]
+
+def test_commit_durability_answers_once_written(app, client, seed, make_queue):
+    seed(users=1, planets=2)
+    make_queue('commit')
+    assert client.post('/favorite/planet/1/1').status_code == 200
+    assert favorite_planet_ids(client, 1) == [1]
+    assert favorite_count(app, 1) == 1
+
+    assert client.post('/favorite/planet/1/1').status_code == 409
+    assert client.delete('/favorite/planet/2/1').status_code == 404
+    assert client.post('/favorite/planet/9/1').status_code == 404
+
+    assert client.delete('/favorite/planet/1/1').status_code == 200
+    assert favorite_planet_ids(client, 1) == []
+    assert favorite_count(app, 1) == 0
+
+def test_queued_durability_answers_202_and_drains_on_close(app, client, seed, make_queue):
+    seed(users=2, planets=2)
+    queue = make_queue('queued')
+    assert client.post('/favorite/planet/1/1').status_code == 202
+    assert client.post('/favorite/planet/1/2').status_code == 202
+    assert client.post('/favorite/planet/2/1').status_code == 202
+    queue.close()
+
+    assert favorite_planet_ids(client, 1) == [1, 2]
+    assert favorite_planet_ids(client, 2) == [1]
+    assert (favorite_count(app, 1), favorite_count(app, 2)) == (2, 1)
+    assert queue.stats()['flushed'] == 3
+
+def test_full_queue_answers_503(app, client, seed, make_queue):
+    seed(users=1, planets=3)
+    applying, release = threading.Event(), threading.Event()
+
+    def slow_apply(changes):
+        applying.set()
+        release.wait(5)
+        favorites.apply_favorite_changes(changes)
+
+    queue = make_queue('queued', max_size=1, apply=slow_apply)
+    assert client.post('/favorite/planet/1/1').status_code == 202
+    # The thread holds the first change; the second fills the queue
+    assert applying.wait(5)
+    assert client.post('/favorite/planet/2/1').status_code == 202
+    assert client.post('/favorite/planet/3/1').status_code == 503
+    release.set()
+    queue.close()
+
+    assert favorite_planet_ids(client, 1) == [1, 2]
+    assert queue.stats()['rejected'] == 1
+
+def test_group_commit_runs_the_same_statements_for_1_or_100_changes(app, seed, statements):
+    seed(users=2, planets=100)
+    executed = statements()
+    with app.app_context():
+        favorites.apply_favorite_changes([('add', 'planet', 1, 1)])
+    one = len(executed)
+
+    executed.clear()
+    with app.app_context():
+        favorites.apply_favorite_changes([('add', 'planet', planet_id, 2) for planet_id in range(1, 101)])
+    assert len(executed) == one
+    assert favorite_count(app, 1) == 2
+    assert favorite_count(app, 100) == 1
+
+def test_group_commit_keeps_the_last_change_per_favorite(app, seed):
+    seed(users=1, planets=2)
+    with app.app_context():
+        favorites.apply_favorite_changes([
+            ('add', 'planet', 1, 1), ('remove', 'planet', 1, 1), ('add', 'planet', 1, 1),
+            ('add', 'planet', 2, 1), ('remove', 'planet', 2, 1),
+        ])
+        assert db.session.execute(db.select(FavoritePlanets.planet_id)).scalars().all() == [1]
+    assert (favorite_count(app, 1), favorite_count(app, 2)) == (1, 0)
+
+def test_failed_batch_is_retried_item_by_item(app):
+    applied = []
+
+    def apply(values):
+        if 'bad' in values:
+            raise ValueError('bad item')
+        applied.extend(values)
+
+    queue = WriteBehindQueue('test', apply)
+    queue.configure(app, max_size=10, batch_size=10, flush_seconds=0.05, durability='commit', commit_timeout=5)
+    items = [queue.submit(key, value) for key, value in enumerate(['a', 'bad', 'b'])]
+    queue.close()
+
+    assert sorted(applied) == ['a', 'b']
+    assert [item.error is not None for item in items] == [False, True, False]
+    assert queue.stats()['failed'] == 1